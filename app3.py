@@ -1,19 +1,39 @@
 import streamlit as st
-import bcrypt
-import sqlite3
+from streamlit.errors import StreamlitAPIException
 from PIL import Image
-import io
-import base64
 import pandas as pd
-from datetime import datetime, date, timedelta
-from sqlalchemy import create_engine, or_, select, func
-from sqlalchemy.orm import sessionmaker
-from models import Base, User, Service, ServiceImage, Booking, Package, PackageBooking
+from datetime import date, timedelta
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import joinedload, selectinload
+from models import User, Service, Booking, Package, PackageBooking, PackageBookingService
 import os
-from database import get_engine,get_session
-import shutil
+from database import get_session, close_session, session_scope
+from availability import get_availability_index
+from inventory import RoomConflict, release_service
+from pagination import keyset_page
+from user_stats import stats_query
+from package_items import build_service_items
+from pricing import quote_package, quote_service
+from catalog import bump_catalog_version, get_catalog
+from images import best_image_path, media_root
+from image_store import release as release_image, save_stream
+from image_cache import get_image_cache
+from static_images import image_server_failed, image_server_running, image_url
+from passwords import (
+    LoginThrottled, PasswordServiceBusy, get_login_throttles, hash_password, needs_rehash, verify_password,
+)
+from identity import bump_auth_version, current_identity, may_sign_in, sign_in, sign_out
+from booking_console import (
+    CONSOLE_STATUSES, apply_status_edits, filter_bookings, load_console, status_edits,
+)
+from booking_writes import (
+    BookingNotFound, add_booking, bulk_update_bookings, change_booking_status, change_package_booking_status, remove_booking,
+    remove_package_booking,
+)
+from gallery_uploads import forget_upload_batch, get_upload_batch, start_gallery_upload
 from pathlib import Path
 import json
+import html
 # Set the app name and favicon
 app_name = "Hotel Booking System"
 favicon_emoji = "🏨"
@@ -23,42 +43,40 @@ st.set_page_config(page_title=app_name, page_icon=favicon_emoji, layout="wide")
 project_root = os.path.dirname(os.path.abspath(__file__))
 
 # Create images directory if it doesn't exist
-IMAGES_DIR = os.path.join(project_root, "static", "images")
+IMAGES_DIR = os.path.join(media_root(), "static", "images")
 os.makedirs(IMAGES_DIR, exist_ok=True)
-session=get_session()
 
 
 
-def save_uploaded_image(uploaded_file, service_id, is_cover=False):
+def save_uploaded_image(uploaded_file):
+    """Store an upload in the image store and return its path.
+
+    Identical bytes are stored once; the reference is counted in the current
+    session's transaction, so commit it together with the row that uses the path.
+    """
     if uploaded_file is None:
         return None
     
-    # Create service directory if it doesn't exist
-    service_dir = os.path.join(IMAGES_DIR, str(service_id))
-    os.makedirs(service_dir, exist_ok=True)
-    
-    # Generate unique filename
     file_ext = Path(uploaded_file.name).suffix
-    filename = f"{'cover' if is_cover else datetime.now().strftime('%Y%m%d_%H%M%S')}{file_ext}"
-    file_path = os.path.join(service_dir, filename)
-    
-    # Save the file
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    
-    # Return relative path from project root
-    return os.path.join("static", "images", str(service_id), filename).replace("\\", "/")
+    uploaded_file.seek(0)
+    image_path = save_stream(get_session(), uploaded_file, file_ext)
+
+    # Pre-build the downscaled copies the pages display; if the file can't be
+    # decoded here, display falls back to the original.
+    try:
+        best_image_path(image_path, "thumb")
+    except (OSError, ValueError, Image.DecompressionBombError):
+        pass
+    return image_path
 
 def delete_service_image(image_path):
+    """Drop one reference to a stored image; the file goes once nothing uses it."""
     if image_path:
-        full_path = os.path.join(project_root, image_path)
-        try:
-            os.remove(full_path)
-        except FileNotFoundError:
-            pass
+        release_image(get_session(), image_path)
 
 def create_user(username, password, role):
-    hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    session = get_session()
+    hashed_password = hash_password(password)
     user = User(
         username=username,
         hashed_password=hashed_password,
@@ -72,7 +90,18 @@ def create_user(username, password, role):
         session.rollback()
         return f"Error creating user: {str(e)}"
 
+def client_ip():
+    context = getattr(st, "context", None)
+    return getattr(context, "ip_address", None)
+
 def authenticate_user_role(username, password, role):
+    """The User for a correct login, else None. Raises LoginThrottled or PasswordServiceBusy instead of checking."""
+    session = get_session()
+    by_username, by_ip = get_login_throttles()
+    ip = client_ip()
+    by_username.check(username)
+    by_ip.check(ip)
+
     user = session.execute(
         select(User).where(
             User.username == username,
@@ -80,9 +109,19 @@ def authenticate_user_role(username, password, role):
         )
     ).scalar_one_or_none()
     
-    if user and bcrypt.checkpw(password.encode(), user.hashed_password):
-        return True
-    return False
+    if user and verify_password(password, user.hashed_password):
+        by_username.succeeded(username)
+        if needs_rehash(user.hashed_password):
+            # BCRYPT_ROUNDS changed since this hash was made
+            try:
+                user.hashed_password = hash_password(password)
+                session.commit()
+            except PasswordServiceBusy:
+                pass
+        return user
+    by_username.failed(username)
+    by_ip.failed(ip)
+    return None
 
 def authenticate_admin(username, password):
     return authenticate_user_role(username, password, "Admin")
@@ -91,20 +130,14 @@ def authenticate_user(username, password):
     return authenticate_user_role(username, password, "User")
 
 def get_available_services(start_date, end_date, category=None):
-    stmt = select(Service)
-    if category and category != "All":
-        stmt = stmt.where(Service.category == category)
-    
-    booked_services_stmt = select(Service.service_id).join(Booking).where(
-        Booking.start_date <= end_date,
-        Booking.end_date >= start_date,
-        Booking.booking_status == "approved"
-    )
-    
-    stmt = stmt.where(~Service.service_id.in_(booked_services_stmt))
-    return session.execute(stmt).scalars().all()
+    session = get_session()
+    services = get_catalog(session).services_in(category)
+
+    # Approved-booking overlap is answered by the in-memory interval index
+    return get_availability_index().filter_available(services, start_date, end_date)
 
 def create_booking(user_id, service_id, start_date, end_date, total_price):
+    session = get_session()
     booking = Booking(
         user_id=user_id,
         service_id=service_id,
@@ -117,14 +150,45 @@ def create_booking(user_id, service_id, start_date, end_date, total_price):
     session.commit()
     return booking
 
-def get_user_bookings(username):
-    stmt = select(Booking).join(User).where(User.username == username)
+# History queries eager-load the rows each history card touches, so a page
+# costs a fixed number of queries however many bookings it shows.
+def get_user_bookings(user_id):
+    session = get_session()
+    stmt = (
+        select(Booking).where(Booking.user_id == user_id)
+        .options(joinedload(Booking.service))
+    )
     return session.execute(stmt).scalars().all()
 
-def get_all_bookings():
-    stmt = select(Booking)
+def get_all_bookings(filters=None, cursor=None, page_size=25):
+    """One keyset page of service bookings, newest first. Returns (bookings, next_cursor)."""
+    session = get_session()
+    stmt = select(Booking).options(joinedload(Booking.service), joinedload(Booking.user))
+    stmt = filter_bookings(stmt, Booking, filters or {})
+    return keyset_page(session, stmt, [Booking.booking_timestamp, Booking.booking_id], cursor, page_size)
+
+# Package bookings come with their selected services (one extra IN query per page)
+PACKAGE_ITEMS = selectinload(PackageBooking.service_items).joinedload(PackageBookingService.service)
+
+def get_user_package_bookings(user_id):
+    session = get_session()
+    stmt = (
+        select(PackageBooking).where(PackageBooking.user_id == user_id)
+        .options(joinedload(PackageBooking.package), PACKAGE_ITEMS)
+    )
     return session.execute(stmt).scalars().all()
 
+def get_all_package_bookings(filters=None, cursor=None, page_size=25):
+    """One keyset page of package bookings, newest first. Returns (bookings, next_cursor)."""
+    session = get_session()
+    stmt = select(PackageBooking).options(
+        joinedload(PackageBooking.package), joinedload(PackageBooking.user), PACKAGE_ITEMS
+    )
+    stmt = filter_bookings(stmt, PackageBooking, filters or {})
+    return keyset_page(
+        session, stmt, [PackageBooking.booking_timestamp, PackageBooking.booking_id], cursor, page_size
+    )
+
 # User authentication state
 if "authentication_status" not in st.session_state:
     st.session_state.authentication_status = None
@@ -132,8 +196,11 @@ if "username" not in st.session_state:
     st.session_state.username = None
 if "role" not in st.session_state:
     st.session_state.role = None
+if "identity" not in st.session_state:
+    st.session_state.identity = None
 
 def login():
+    session = get_session()
     tab1, tab2 = st.tabs(["Login", "Sign Up"])
     
     with tab1:
@@ -143,24 +210,25 @@ def login():
         role = st.selectbox("Role", ["User", "Admin"])
 
         if st.button("Login"):
-            if role == "Admin":
-                auth_status = authenticate_admin(username, password)
-            else:
-                auth_status = authenticate_user(username, password)
+            try:
+                if role == "Admin":
+                    user = authenticate_admin(username, password)
+                else:
+                    user = authenticate_user(username, password)
+            except LoginThrottled as e:
+                st.error(str(e))
+                return
+            except PasswordServiceBusy:
+                st.error("The server is busy. Please try again in a moment.")
+                return
 
-            if auth_status:
+            if user:
                 # Check if account is active (for users only)
-                if role == "User":
-                    user = session.execute(
-                        select(User).where(User.username == username)
-                    ).scalar_one_or_none()
-                    if not user.is_active:
-                        st.error("Your account has been disabled. Please contact admin.")
-                        return
+                if not may_sign_in(user, role):
+                    st.error("Your account has been disabled. Please contact admin.")
+                    return
                 
-                st.session_state.authentication_status = True
-                st.session_state.username = username
-                st.session_state.role = role
+                sign_in(user, role)
                 st.success("Login successful")
                 st.rerun()
             else:
@@ -186,7 +254,7 @@ def login():
                     return
                 
                 try:
-                    hashed_password = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt())
+                    hashed_password = hash_password(new_password)
                     user = User(
                         username=new_username,
                         hashed_password=hashed_password,
@@ -199,25 +267,101 @@ def login():
                     session.commit()
                     session.rollback()
                     st.success("Account created successfully! Please login.")
+                except PasswordServiceBusy:
+                    st.error("The server is busy. Please try again in a moment.")
                 except Exception as e:
                     st.error(f"Error creating account: User already exist")
                     session.rollback()
 
 def logout():
-    st.session_state.authentication_status = None
-    st.session_state.username = None
-    st.session_state.role = None
+    sign_out()
     st.rerun()
 
-def display_image_safely(image_path, use_container_width=True):
-    """Safely display an image with error handling"""
+def image_tag(image_path, size="card", use_container_width=True):
+    """A lazy-loading <img> for the image at the given rendition size, or None if it can't be shown.
+
+    The browser loads it from a cacheable static URL instead of the websocket.
+    """
+    if not image_path:
+        return None
     try:
-        if image_path:
-            st.image(image_path, use_container_width=use_container_width)
-        else:
-            st.info("No image available")
-    except Exception:
+        url = html.escape(image_url(best_image_path(image_path, size)))
+    except (OSError, ValueError):
+        return None
+    width = "width:100%" if use_container_width else "max-width:100%"
+    return f'<img src="{url}" loading="lazy" style="{width}">'
+
+def display_image_safely(image_path, size="card", use_container_width=True):
+    """Safely display an image with error handling, at the given rendition size"""
+    tag = image_tag(image_path, size, use_container_width)
+    if tag:
+        st.markdown(tag, unsafe_allow_html=True)
+    elif image_path:
         st.info("Image not available")
+    else:
+        st.info("No image available")
+
+CATALOG_GRID_CSS = """
+<style>
+.catalog-row { display: grid; gap: 1rem; align-items: start; }
+.catalog-row img { border-radius: 8px; }
+.no-image { padding: 2rem 1rem; text-align: center; background: #f0f2f6; border-radius: 8px; color: #555; }
+.service-previews { display: grid; grid-template-columns: repeat(3, minmax(0, 1fr)); gap: 0.5rem; }
+.service-previews figure { margin: 0; }
+.service-previews figcaption { font-size: 0.8em; color: #666; }
+</style>
+"""
+
+def catalog_grid(key, items, item_id, render_card, columns=3, page_size=12):
+    """Show `items` as cards, `page_size` at a time with a "Load more" button.
+
+    Each row of cards is a single HTML block; its images load only when
+    they scroll into view. The list goes back to one page whenever the
+    items change (new filters). Returns the item whose View Details button
+    was clicked, or None.
+    """
+    visible_key, signature_key = f"{key}_visible", f"{key}_signature"
+    signature = tuple(item_id(item) for item in items)
+    if st.session_state.get(signature_key) != signature:
+        st.session_state[signature_key] = signature
+        st.session_state[visible_key] = page_size
+    visible = min(st.session_state[visible_key], len(items))
+
+    selected = None
+    for start in range(0, visible, columns):
+        row = items[start:start + columns]
+        # Markdown ends an HTML block at a blank line, so each card is flattened to one line;
+        # line breaks become spaces so the words either side of them stay apart
+        cards = "".join(f"<div>{' '.join(render_card(item).splitlines())}</div>" for item in row)
+        st.markdown(
+            f'<div class="catalog-row" style="grid-template-columns: repeat({columns}, minmax(0, 1fr))">{cards}</div>',
+            unsafe_allow_html=True,
+        )
+        for col, item in zip(st.columns(columns), row):
+            with col:
+                if st.button("View Details", key=f"{key}_view_{item_id(item)}"):
+                    selected = item
+
+    if visible < len(items):
+        st.caption(f"Showing {visible} of {len(items)}")
+
+        def load_more():
+            st.session_state[visible_key] = visible + page_size
+
+        st.button("Load more", key=f"{key}_more", on_click=load_more)
+    return selected
+
+def no_image_html():
+    return '<div class="no-image">No image available</div>'
+
+def service_card_html(service):
+    return f"""{image_tag(service.cover_image, size="card") or no_image_html()}
+<div class="service-card">
+<h3>{html.escape(service.name)}</h3>
+<p class="service-price">{service.price_rwf:,.0f} RWF/night</p>
+<p><strong>Size:</strong> {html.escape(service.size or "")}</p>
+<p><strong>Max Guests:</strong> {service.max_capacity or 1}</p>
+</div>"""
 
 def home_page():
     st.title("Welcome to Great hotel Kiyovu ")
@@ -266,59 +410,87 @@ def home_page():
             font-weight: bold;
         }
         </style>
-        """, unsafe_allow_html=True)
+        """ + CATALOG_GRID_CSS, unsafe_allow_html=True)
         
-        cols = st.columns(3)
-        for idx, service in enumerate(available_services):
-            with cols[idx % 3]:
-                with st.container():
-                    display_image_safely(service.cover_image)
-                    
-                    st.markdown(f"""
-                    <div class="service-card">
-                        <h3>{service.name}</h3>
-                        <p class="service-price">{service.price_rwf:,.0f} RWF/night</p>
-                        <p><strong>Size:</strong> {service.size}</p>
-                        <p><strong>Max Guests:</strong> {service.max_capacity or 1}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    if st.button("View Details", key=f"view_{service.service_id}"):
-                        st.session_state.selected_service = service.service_id
-                        st.rerun()
+        selected = catalog_grid(
+            "home_services", available_services, lambda s: s.service_id, service_card_html, columns=3, page_size=12
+        )
+        if selected:
+            st.session_state.selected_service = selected.service_id
+            st.rerun()
     else:
         st.warning("No available rooms found for the selected dates and category.") 
 
-def add_service_image(service_id, image_file, caption=""):
-    image_path = save_uploaded_image(image_file, service_id)
-    if image_path:
-        service_image = ServiceImage(
-            service_id=service_id,
-            image_path=image_path,
-            caption=caption
-        )
-        session.add(service_image)
-        session.commit()
+@st.fragment(run_every=1)
+def gallery_upload_progress(batch_id):
+    """Progress bar of a running upload; reruns itself every second until the batch is done."""
+    batch = get_upload_batch(batch_id)
+    if batch is None or batch.finished:
+        st.rerun()  # the whole page shows the outcome, and polling stops
+    st.progress(batch.processed / batch.total, text=f"Processing images: {batch.processed}/{batch.total}")
+
+def gallery_upload_status(service_id):
+    """Progress and outcome of the service's background gallery upload, if any."""
+    key = f"gallery_upload_{service_id}"
+    batch = get_upload_batch(st.session_state[key]) if key in st.session_state else None
+    if batch is None:
+        st.session_state.pop(key, None)
+        return
+
+    if not batch.finished:
+        gallery_upload_progress(batch.id)
+        return
+
+    if batch.added:
+        st.success(f"{batch.added} of {batch.total} images added.")
+    for name, reason in batch.failures.items():
+        st.warning(f"{name}: {reason}")
+    if batch.error:
+        st.error(f"Error adding images: {batch.error}")
+
+    def dismiss():
+        forget_upload_batch(batch.id)
+        st.session_state.pop(key, None)
+
+    st.button("Dismiss", key=f"dismiss_upload_{service_id}", on_click=dismiss)
 
 def delete_service(service_id):
+    session = get_session()
     service = session.get(Service, service_id)
     if service:
-        # Delete all images from filesystem
+        # Release the service's images; files shared with other records stay
         if service.cover_image:
             delete_service_image(service.cover_image)
         for image in service.images:
             delete_service_image(image.image_path)
         
-        # Delete service directory
-        service_dir = os.path.join(IMAGES_DIR, str(service_id))
-        shutil.rmtree(service_dir, ignore_errors=True)
-        
         # Delete from database
+        release_service(session, service_id)
+        # Package bookings keep their totals; only this service's line items go
+        session.execute(delete(PackageBookingService).where(PackageBookingService.service_id == service_id))
         session.delete(service)
+        bump_catalog_version(session)
         session.commit()
+        get_availability_index().drop_service(service_id)
+
+def image_cache_stats():
+    if image_server_failed():
+        st.warning("The image server could not start (see the log), so images are served by Streamlit.")
+    if not image_server_running():
+        return  # Streamlit serves the images; the cache isn't in the path
+    stats = get_image_cache().stats()
+    lookups = stats["hits"] + stats["misses"]
+    with st.expander("Image cache"):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hit rate", f"{stats['hits'] / lookups:.0%}" if lookups else "-")
+        col2.metric("Misses", stats["misses"])
+        col3.metric("Evictions", stats["evictions"])
+        col4.metric("Size", f"{stats['bytes'] / 2**20:.1f} / {stats['max_bytes'] / 2**20:.0f} MiB")
 
 def service_management_page():
+    session = get_session()
     st.header("Service Management")
+    image_cache_stats()
     
     # Create new service
     with st.expander("➕ Add New Service", expanded=False):
@@ -351,12 +523,14 @@ def service_management_page():
                             is_add_on=is_add_on
                         )
                         session.add(service)
+                        bump_catalog_version(session)
                         session.commit()
 
                         # Handle cover image
                         if cover_image:
-                            image_path = save_uploaded_image(cover_image, service.service_id, is_cover=True)
+                            image_path = save_uploaded_image(cover_image)
                             service.cover_image = image_path
+                            bump_catalog_version(session)
                             session.commit()
 
                         st.success("Service created successfully!")
@@ -423,7 +597,7 @@ def service_management_page():
                                 service.details = details
                                 service.max_capacity = max_capacity
                                 service.is_add_on = is_add_on
-                                
+                                bump_catalog_version(session)
                                 session.commit()
                                 st.success("Service updated successfully!")
                                 st.rerun()
@@ -442,7 +616,7 @@ def service_management_page():
                 with tab2:
                     # Cover image
                     st.subheader("Cover Image")
-                    display_image_safely(service.cover_image)
+                    display_image_safely(service.cover_image, size="thumb")
                     
                     with st.form(f"update_cover_{service.service_id}"):
                         uploaded_file = st.file_uploader("Upload Cover Image", type=["jpg", "jpeg", "png"])
@@ -450,8 +624,9 @@ def service_management_page():
                             try:
                                 if service.cover_image:
                                     delete_service_image(service.cover_image)
-                                image_path = save_uploaded_image(uploaded_file, service.service_id, is_cover=True)
+                                image_path = save_uploaded_image(uploaded_file)
                                 service.cover_image = image_path
+                                bump_catalog_version(session)
                                 session.commit()
                                 st.success("Cover image updated!")
                                 st.rerun()
@@ -464,7 +639,7 @@ def service_management_page():
                         gallery_cols = st.columns(3)
                         for idx, image in enumerate(service.images):
                             with gallery_cols[idx % 3]:
-                                display_image_safely(image.image_path)
+                                display_image_safely(image.image_path, size="thumb")
                                 if st.button("🗑️", key=f"del_img_{image.image_id}"):
                                     try:
                                         delete_service_image(image.image_path)
@@ -478,6 +653,7 @@ def service_management_page():
                         st.info("No images in the gallery yet")
                     
                     # Add new images
+                    gallery_upload_status(service.service_id)
                     with st.form(f"add_images_{service.service_id}"):
                         uploaded_files = st.file_uploader(
                             "Add Gallery Images",
@@ -487,15 +663,20 @@ def service_management_page():
                         caption = st.text_input("Caption (optional)")
                         
                         if st.form_submit_button("Add Images", use_container_width=True) and uploaded_files:
-                            try:
-                                for img in uploaded_files:
-                                    add_service_image(service.service_id, img, caption)
-                                st.success("Images added successfully!")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Error adding images: {str(e)}")
+                            batch = start_gallery_upload(service.service_id, uploaded_files, caption)
+                            st.session_state[f"gallery_upload_{service.service_id}"] = batch.id
+                            st.rerun()
+
+def load_services(service_ids):
+    """ORM Service rows for the given IDs (for writes; reads use the catalog)."""
+    session = get_session()
+    if not service_ids:
+        return []
+    return session.execute(select(Service).where(Service.service_id.in_(service_ids))).scalars().all()
 
 def package_management_page():
+    session = get_session()
+    catalog = get_catalog(session)
     st.header("Package Management")
     
     # Create new package
@@ -515,8 +696,7 @@ def package_management_page():
                 cover_image = st.file_uploader("Cover Image", type=["jpg", "jpeg", "png"])
                 
                 # Select services to include
-                available_services = session.execute(select(Service)).scalars().all()
-                service_options = {s.name: s for s in available_services}
+                service_options = {s.name: s.service_id for s in catalog.services.values()}
                 selected_services = st.multiselect(
                     "Include Services",
                     options=list(service_options.keys())
@@ -536,16 +716,17 @@ def package_management_page():
                         )
                         
                         # Add selected services
-                        for service_name in selected_services:
-                            package.services.append(service_options[service_name])
+                        package.services = load_services([service_options[n] for n in selected_services])
                         
                         session.add(package)
+                        bump_catalog_version(session)
                         session.commit()
 
                         # Handle cover image
                         if cover_image:
-                            image_path = save_uploaded_image(cover_image, package.package_id, is_cover=True)
+                            image_path = save_uploaded_image(cover_image)
                             package.cover_image = image_path
+                            bump_catalog_version(session)
                             session.commit()
 
                         st.success("Package created successfully!")
@@ -587,9 +768,9 @@ def package_management_page():
                         is_customizable = st.checkbox("Is Customizable", value=package.is_customizable)
                         
                         # Select services to include
-                        available_services = session.execute(select(Service)).scalars().all()
-                        service_options = {s.name: s for s in available_services}
-                        current_services = [s.name for s in package.services]
+                        service_options = {s.name: s.service_id for s in catalog.services.values()}
+                        package_info = catalog.packages.get(package.package_id)
+                        current_services = [s.name for s in catalog.package_services(package_info)] if package_info else []
                         selected_services = st.multiselect(
                             "Include Services",
                             options=list(service_options.keys()),
@@ -613,8 +794,8 @@ def package_management_page():
                             package.is_customizable = is_customizable
                             
                             # Update services
-                            package.services = [service_options[name] for name in selected_services]
-                            
+                            package.services = load_services([service_options[name] for name in selected_services])
+                            bump_catalog_version(session)
                             session.commit()
                             st.success("Package updated successfully!")
                             st.rerun()
@@ -626,6 +807,7 @@ def package_management_page():
                             if package.cover_image:
                                 delete_service_image(package.cover_image)
                             session.delete(package)
+                            bump_catalog_version(session)
                             session.commit()
                             st.success("Package deleted successfully!")
                             st.rerun()
@@ -636,7 +818,7 @@ def package_management_page():
             with tab2:
                 # Cover image
                 st.subheader("Cover Image")
-                display_image_safely(package.cover_image)
+                display_image_safely(package.cover_image, size="thumb")
                 
                 with st.form(f"update_cover_{package.package_id}"):
                     uploaded_file = st.file_uploader("Upload Cover Image", type=["jpg", "jpeg", "png"])
@@ -644,8 +826,9 @@ def package_management_page():
                         try:
                             if package.cover_image:
                                 delete_service_image(package.cover_image)
-                            image_path = save_uploaded_image(uploaded_file, package.package_id, is_cover=True)
+                            image_path = save_uploaded_image(uploaded_file)
                             package.cover_image = image_path
+                            bump_catalog_version(session)
                             session.commit()
                             st.success("Cover image updated!")
                             st.rerun()
@@ -655,10 +838,12 @@ def package_management_page():
             with tab3:
                 # Manage included services
                 st.subheader("Included Services")
+                package_info = catalog.packages.get(package.package_id)
+                included_services = catalog.package_services(package_info) if package_info else []
                 service_cols = st.columns(3)
-                for idx, service in enumerate(package.services):
+                for idx, service in enumerate(included_services):
                     with service_cols[idx % 3]:
-                        display_image_safely(service.cover_image)
+                        display_image_safely(service.cover_image, size="thumb")
                         st.markdown(f"""
                         <div style='text-align: center'>
                             <p><strong>{service.name}</strong></p>
@@ -670,19 +855,14 @@ def package_management_page():
                 # Add-on services
                 if package.is_customizable:
                     st.subheader("Available Add-ons")
-                    add_on_services = session.execute(
-                        select(Service).where(
-                            Service.is_add_on == True,
-                            ~Service.service_id.in_([s.service_id for s in package.services])
-                        )
-                    ).scalars().all()
+                    add_on_services = catalog.add_ons({s.service_id for s in included_services})
                     
                     if add_on_services:
                         addon_cols = st.columns(2)
                         for idx, service in enumerate(add_on_services):
                             with addon_cols[idx % 2]:
                                 if service.cover_image:
-                                    st.image(service.cover_image, use_container_width=True)
+                                    display_image_safely(service.cover_image, size="thumb")
                                 st.markdown(f"""
                                 <div style='text-align: center'>
                                     <p><strong>{service.name}</strong></p>
@@ -691,15 +871,81 @@ def package_management_page():
                                 </div>
                                 """, unsafe_allow_html=True)
 
+PAGE_SIZES = [10, 25, 50, 100]
+
+def keyset_pager(key, signature):
+    """Cursor stack for a keyset-paginated list; starts over when the filters change."""
+    state = st.session_state.setdefault(f"{key}_pager", {"signature": signature, "cursors": [None]})
+    if state["signature"] != signature:
+        state["signature"], state["cursors"] = signature, [None]
+    return state
+
+def pager_controls(key, state, next_cursor):
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        st.button("← Previous", key=f"{key}_prev", disabled=len(state["cursors"]) == 1,
+                  on_click=state["cursors"].pop)
+    with col2:
+        st.button("Next →", key=f"{key}_next", disabled=next_cursor is None,
+                  on_click=state["cursors"].append, args=(next_cursor,))
+    with col3:
+        st.caption(f"Page {len(state['cursors'])}")
+
+def booking_filters(key, item_label, item_options):
+    """Admin filter bar for a booking list. Returns (filters, page_size)."""
+    col1, col2, col3, col4, col5 = st.columns([1, 2, 2, 2, 1])
+    with col1:
+        status = st.selectbox("Status", ["All", "pending", "approved", "rejected"], key=f"{key}_status")
+    with col2:
+        item_name = st.selectbox(item_label, ["All", *item_options], key=f"{key}_item")
+    with col3:
+        username = st.text_input("Username", key=f"{key}_username")
+    with col4:
+        stay = st.date_input("Stay overlaps", value=(), key=f"{key}_stay")
+    with col5:
+        page_size = st.selectbox("Page size", PAGE_SIZES, index=1, key=f"{key}_page_size")
+
+    start_date, end_date = stay if len(stay) == 2 else (None, None)
+    filters = {
+        "status": status,
+        "item_id": item_options.get(item_name),
+        "username": username.strip(),
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+    return filters, page_size
+
 def user_management_page():
+    session = get_session()
     st.header("User Management")
+    reset_row_state()
     
-    # Get all users
-    users = session.execute(select(User)).scalars().all()
-    
-    # Display users in a grid
+    # Filters are applied in SQL and the list is paged by user_id
     st.subheader("User List")
-    for user in users:
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        search = st.text_input("Username starts with", key="users_search").strip()
+    with col2:
+        role = st.selectbox("Role", ["All", "Admin", "User"], key="users_role")
+    with col3:
+        status = st.selectbox("Status", ["All", "Active", "Disabled"], key="users_status")
+    with col4:
+        page_size = st.selectbox("Page size", PAGE_SIZES, index=1, key="users_page_size")
+
+    stmt = select(User)
+    if search:
+        stmt = stmt.where(User.username.startswith(search, autoescape=True))
+    if role != "All":
+        stmt = stmt.where(User.role == role)
+    if status != "All":
+        stmt = stmt.where(User.is_active == (status == "Active"))
+    pager = keyset_pager("users", (search, role, status, page_size))
+    # Booking counts, spend and last booking come back in the same query
+    rows, next_cursor = keyset_page(session, stats_query(stmt), [User.user_id], pager["cursors"][-1], page_size,
+                                    descending=False, scalars=False)
+    pager_controls("users", pager, next_cursor)
+    
+    for user, service_bookings, package_bookings, total_spend, last_booking_at in rows:
         with st.expander(f"User: {user.username} ({user.role})"):
             col1, col2 = st.columns(2)
             
@@ -710,53 +956,221 @@ def user_management_page():
                 st.write(f"Created: {user.created_at.strftime('%Y-%m-%d')}")
             
             with col2:
-                st.write(f"Status: {'Active' if user.is_active else 'Disabled'}")
-                # Booking counts
-                booking_count = session.execute(
-                    select(func.count()).select_from(Booking).where(Booking.user_id == user.user_id)
-                ).scalar()
-                package_booking_count = session.execute(
-                    select(func.count()).select_from(PackageBooking).where(PackageBooking.user_id == user.user_id)
-                ).scalar()
-                st.write(f"Service Bookings: {booking_count}")
-                st.write(f"Package Bookings: {package_booking_count}")
+                st.write(f"Service Bookings: {service_bookings}")
+                st.write(f"Package Bookings: {package_bookings}")
+                st.write(f"Total Spend: {total_spend:,.0f} RWF")
+                st.write(f"Last Booking: {last_booking_at.strftime('%Y-%m-%d') if last_booking_at else 'Never'}")
             
             # Action buttons
             if user.username != "admin":  # Prevent actions on admin account
-                col1, col2 = st.columns(2)
-                with col1:
-                    if user.is_active:
-                        if st.button("Disable Account", key=f"disable_{user.user_id}"):
-                            user.is_active = False
-                            session.commit()
-                            st.success("Account disabled!")
-                            st.rerun()
-                    else:
-                        if st.button("Enable Account", key=f"enable_{user.user_id}"):
-                            user.is_active = True
-                            session.commit()
-                            st.success("Account enabled!")
-                            st.rerun()
-                
-                with col2:
-                    if st.button("Delete Account", key=f"delete_{user.user_id}"):
-                        session.delete(user)
-                        session.commit()
-                        st.success("Account deleted!")
-                        st.rerun()
+                user_actions(user.user_id, bool(user.is_active))
+
+# Row actions are fragments: a click reruns only that row. The row records
+# what it changed here, so it can redraw itself without reloading the page;
+# a full rerun reads everything fresh and starts over.
+def reset_row_state():
+    st.session_state.row_state = {}
+
+def row_state(key, value):
+    return st.session_state.get("row_state", {}).get(key, value)
+
+def set_row_state(key, value, message):
+    st.session_state.setdefault("row_state", {})[key] = value
+    st.toast(message)
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()  # the click came in with a full run
+
+@st.fragment
+def user_actions(user_id, is_active):
+    is_active = row_state(("user", user_id), is_active)
+    if is_active is None:
+        st.info("Account deleted.")
+        return
+    st.write(f"Status: {'Active' if is_active else 'Disabled'}")
+    col1, col2 = st.columns(2)
+    with col1:
+        label, key = ("Disable Account", "disable") if is_active else ("Enable Account", "enable")
+        if st.button(label, key=f"{key}_{user_id}"):
+            with session_scope() as session:
+                session.execute(update(User).where(User.user_id == user_id).values(is_active=not is_active))
+                bump_auth_version(session, user_id)
+            set_row_state(("user", user_id), not is_active, f"Account {key}d!")
+    with col2:
+        if st.button("Delete Account", key=f"delete_{user_id}"):
+            with session_scope() as session:
+                user = session.get(User, user_id)
+                if user is not None:
+                    session.delete(user)
+            set_row_state(("user", user_id), None, "Account deleted!")
+
+BOOKING_WRITES = {
+    "service": (change_booking_status, remove_booking, ""),
+    "package": (change_package_booking_status, remove_package_booking, "pkg_"),
+}
+
+@st.fragment
+def booking_actions(kind, booking_id):
+    """Approve/reject (admin) or cancel (owner) a booking that was pending when the page loaded."""
+    change_status, remove, prefix = BOOKING_WRITES[kind]
+    status = row_state((kind, booking_id), "pending")
+    if status != "pending":
+        st.info(f"Status: {status.upper()}" if status else "This booking was cancelled.")
+        return
+    if st.session_state.role == "Admin":
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Approve", key=f"approve_{prefix}{booking_id}"):
+                try:
+                    change_status(booking_id, "approved")
+                except RoomConflict:
+                    st.error("These dates are already booked for this service.")
+                except BookingNotFound:
+                    set_row_state((kind, booking_id), None, "This booking no longer exists.")
+                else:
+                    set_row_state((kind, booking_id), "approved", "Booking approved!")
+        with col2:
+            if st.button("Reject", key=f"reject_{prefix}{booking_id}"):
+                try:
+                    change_status(booking_id, "rejected")
+                except BookingNotFound:
+                    set_row_state((kind, booking_id), None, "This booking no longer exists.")
+                else:
+                    set_row_state((kind, booking_id), "rejected", "Booking rejected!")
+    else:
+        if st.button("Cancel Booking", key=f"cancel_{prefix}{booking_id}"):
+            try:
+                remove(booking_id)
+            except BookingNotFound:
+                pass  # already gone
+            set_row_state((kind, booking_id), None, "Booking cancelled!")
+
+def bulk_actions(key, model, bookings, describe):
+    """Approve/reject/cancel the selected pending bookings of this page in one transaction."""
+    report = st.session_state.pop(f"{key}_bulk_report", None)
+    if report:
+        st.dataframe(pd.DataFrame(report, columns=["Booking", "Outcome"]), hide_index=True, use_container_width=True)
+
+    pending = {b.booking_id: describe(b) for b in bookings if b.booking_status == "pending"}
+    if not pending:
+        return
+    with st.form(f"{key}_bulk"):
+        selected = st.multiselect("Pending bookings on this page", list(pending), format_func=pending.get)
+        action = st.radio("Action", ["Approve", "Reject", "Cancel"], horizontal=True)
+        if st.form_submit_button("Apply to selected") and selected:
+            try:
+                outcomes = bulk_update_bookings(model, selected, action.lower())
+            except RoomConflict:
+                st.error("The calendar changed while checking; please try again.")
+                return
+            st.session_state[f"{key}_bulk_report"] = [(pending.get(i, i), outcome) for i, outcome in outcomes.items()]
+            st.rerun()
+
+def booking_console_page():
+    """All bookings in one table; status edits are applied together as a diff."""
+    session = get_session()
+    st.title("Booking Console")
+
+    report = st.session_state.pop("console_report", None)
+    if report is not None:
+        st.dataframe(report, hide_index=True, use_container_width=True)
+
+    col1, col2, col3, col4 = st.columns([1, 1, 2, 2])
+    with col1:
+        kind = st.selectbox("Type", ["All", "Service", "Package"], key="console_kind")
+    with col2:
+        status = st.selectbox("Status", ["All", "pending", "approved", "rejected"], key="console_status")
+    with col3:
+        username = st.text_input("Username", key="console_username")
+    with col4:
+        stay = st.date_input("Stay overlaps", value=(), key="console_stay")
+    start_date, end_date = stay if len(stay) == 2 else (None, None)
+    filters = {"status": status, "username": username.strip(), "start_date": start_date, "end_date": end_date}
+    kinds = ["Service", "Package"] if kind == "All" else [kind]
+
+    # The loaded table stays put across reruns, so edits line up with the rows they were made on
+    signature = (tuple(kinds), tuple(filters.items()))
+    snapshot = st.session_state.get("console_snapshot")
+    if snapshot is None or snapshot["signature"] != signature:
+        bookings, truncated = load_console(session, kinds, filters)
+        generation = snapshot["generation"] + 1 if snapshot else 0
+        snapshot = {"signature": signature, "bookings": bookings, "truncated": truncated, "generation": generation}
+        st.session_state.console_snapshot = snapshot
+    bookings = snapshot["bookings"]
+
+    st.caption(f"{len(bookings):,} bookings" + (" (showing the newest only; narrow the filters)" if snapshot["truncated"] else ""))
+    column_config = {
+        "kind": "Type",
+        "booking_id": st.column_config.NumberColumn("Booking", format="%d"),
+        "username": "Username",
+        "full_name": "Booked by",
+        "phone_number": "Phone",
+        "item": "Service / package",
+        "start_date": st.column_config.DateColumn("Start"),
+        "end_date": st.column_config.DateColumn("End"),
+        "guests": "Guests",
+        "total_price_rwf": st.column_config.NumberColumn("Total (RWF)", format="%.0f"),
+        "status": st.column_config.SelectboxColumn("Status", options=CONSOLE_STATUSES, required=True),
+        "booked_at": st.column_config.DatetimeColumn("Booked at", format="YYYY-MM-DD HH:mm"),
+        "special_requests": "Special requests",
+    }
+    # Only pending bookings can change status, so only they get the status dropdown
+    pending = bookings[bookings["status"] == "pending"]
+    decided = bookings[bookings["status"] != "pending"]
+
+    st.subheader(f"Pending ({len(pending):,})")
+    edited = st.data_editor(
+        pending,
+        key=f"console_editor_{snapshot['generation']}",
+        hide_index=True,
+        use_container_width=True,
+        disabled=[column for column in bookings.columns if column != "status"],
+        column_config=column_config,
+    )
+    if not decided.empty:
+        st.subheader(f"Approved and rejected ({len(decided):,})")
+        st.dataframe(decided, hide_index=True, use_container_width=True, column_config=column_config)
+
+    changes = status_edits(pending, edited)
+    col1, col2 = st.columns([1, 4])
+    with col1:
+        apply = st.button(f"Apply {len(changes)} change(s)", disabled=changes.empty, key="console_apply")
+    with col2:
+        if st.button("Reload", key="console_reload"):
+            st.session_state.console_snapshot["signature"] = None
+            st.rerun()
+    if apply:
+        try:
+            st.session_state.console_report = apply_status_edits(changes)
+        except RoomConflict:
+            st.error("The calendar changed while checking; please try again.")
+            return
+        st.session_state.console_snapshot["signature"] = None  # reload with the new statuses
+        st.rerun()
 
 def booking_history_page():
+    session = get_session()
     st.title("Booking History")
+    reset_row_state()
     
     # Tabs for different booking types
     tab1, tab2 = st.tabs(["Service Bookings", "Package Bookings"])
     
     with tab1:
         if st.session_state.role == "Admin":
-            bookings = session.execute(select(Booking)).scalars().all()
             st.subheader("All Service Bookings")
+            service_options = dict(session.execute(select(Service.name, Service.service_id)).all())
+            filters, page_size = booking_filters("service_history", "Service", service_options)
+            pager = keyset_pager("service_history", (tuple(filters.items()), page_size))
+            bookings, next_cursor = get_all_bookings(filters, pager["cursors"][-1], page_size)
+            pager_controls("service_history", pager, next_cursor)
+            bulk_actions(
+                "service_history", Booking, bookings,
+                lambda b: f"#{b.booking_id} {b.service.name if b.service else 'Deleted service'} {b.start_date} → {b.end_date}",
+            )
         else:
-            bookings = get_user_bookings(st.session_state.username)
+            bookings = get_user_bookings(st.session_state.identity.user_id)
             st.subheader("Your Service Bookings")
 
         for booking in bookings:
@@ -783,40 +1197,23 @@ def booking_history_page():
                     st.write("Special Requests:", booking.special_requests)
                 
                 if booking.booking_status == "pending":
-                    if st.session_state.role == "Admin":
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            if st.button("Approve", key=f"approve_{booking.booking_id}"):
-                                booking.booking_status = "approved"
-                                session.commit()
-                                st.success("Booking approved!")
-                                st.rerun()
-                        with col2:
-                            if st.button("Reject", key=f"reject_{booking.booking_id}"):
-                                booking.booking_status = "rejected"
-                                session.commit()
-                                st.success("Booking rejected!")
-                                st.rerun()
-                    else:
-                        if st.button("Cancel Booking", key=f"cancel_{booking.booking_id}"):
-                            session.delete(booking)
-                            session.commit()
-                            st.success("Booking cancelled!")
-                            st.rerun()
+                    booking_actions("service", booking.booking_id)
     
     with tab2:
         if st.session_state.role == "Admin":
-            package_bookings = session.execute(select(PackageBooking)).scalars().all()
             st.subheader("All Package Bookings")
+            package_options = dict(session.execute(select(Package.name, Package.package_id)).all())
+            filters, page_size = booking_filters("package_history", "Package", package_options)
+            pager = keyset_pager("package_history", (tuple(filters.items()), page_size))
+            package_bookings, next_cursor = get_all_package_bookings(filters, pager["cursors"][-1], page_size)
+            pager_controls("package_history", pager, next_cursor)
+            bulk_actions(
+                "package_history", PackageBooking, package_bookings,
+                lambda b: f"#{b.booking_id} {b.package.name if b.package else 'Deleted package'} {b.start_date} → {b.end_date}",
+            )
         else:
-            user = session.execute(
-                select(User).where(User.username == st.session_state.username)
-            ).scalar_one_or_none()
-            if user:
-                package_bookings = session.execute(
-                    select(PackageBooking).where(PackageBooking.user_id == user.user_id)
-                ).scalars().all()
-                st.subheader("Your Package Bookings")
+            package_bookings = get_user_package_bookings(st.session_state.identity.user_id)
+            st.subheader("Your Package Bookings")
 
         for booking in package_bookings:
             with st.expander(f"Package Booking {booking.booking_id} - {booking.booking_status.upper()}"):
@@ -840,50 +1237,28 @@ def booking_history_page():
                             st.write("Booked by: Unknown")
                     
                     # Show selected services
-                    selected_services = json.loads(booking.selected_services)
-                    services = session.execute(
-                        select(Service).where(Service.service_id.in_(selected_services))
-                    ).scalars().all()
                     st.write("Selected Services:")
-                    for service in services:
-                        st.write(f"- {service.name}")
+                    for item in booking.service_items:
+                        if item.service:
+                            extra = f" (+{item.price_rwf:,.0f} RWF)" if item.price_rwf else ""
+                            st.write(f"- {item.service.name}{extra}")
                 
                 if booking.special_requests:
                     st.write("Special Requests:", booking.special_requests)
                 
                 if booking.booking_status == "pending":
-                    if st.session_state.role == "Admin":
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            if st.button("Approve", key=f"approve_pkg_{booking.booking_id}"):
-                                booking.booking_status = "approved"
-                                session.commit()
-                                st.success("Booking approved!")
-                                st.rerun()
-                        with col2:
-                            if st.button("Reject", key=f"reject_pkg_{booking.booking_id}"):
-                                booking.booking_status = "rejected"
-                                session.commit()
-                                st.success("Booking rejected!")
-                                st.rerun()
-                    else:
-                        if st.button("Cancel Booking", key=f"cancel_pkg_{booking.booking_id}"):
-                            session.delete(booking)
-                            session.commit()
-                            st.success("Booking cancelled!")
-                            st.rerun()
+                    booking_actions("package", booking.booking_id)
 
 def packages_page():
+    session = get_session()
     st.title("Event Packages")
     
     # Filter packages by category
     category = st.selectbox("Category", ["All", "Wedding", "Conference"])
     
     # Get packages
-    stmt = select(Package)
-    if category != "All":
-        stmt = stmt.where(Package.category == category)
-    packages = session.execute(stmt).scalars().all()
+    catalog = get_catalog(session)
+    packages = catalog.packages_in(category)
     
     if packages:
         # CSS for package cards
@@ -927,55 +1302,46 @@ def packages_page():
             color: #555;
         }
         </style>
-        """, unsafe_allow_html=True)
+        """ + CATALOG_GRID_CSS, unsafe_allow_html=True)
         
-        # Display packages in a grid
-        cols = st.columns(2)
-        for idx, package in enumerate(packages):
-            with cols[idx % 2]:
-                with st.container():
-                    # Display cover image
-                    display_image_safely(package.cover_image)
-                    
-                    st.markdown(f"""
-                    <div class="package-card">
-                        <h3>{package.name}</h3>
-                        <p class="package-price">{package.base_price_rwf:,.0f} RWF</p>
-                        <p><strong>Category:</strong> {package.category}</p>
-                        <p><strong>Duration:</strong> {package.duration_days} day{'s' if package.duration_days > 1 else ''}</p>
-                        <p><strong>Max Guests:</strong> {package.max_guests}</p>
-                        <p>{package.description}</p>
-                        <div class="included-services">
-                            <p><strong>Included Services:</strong></p>
-                    """, unsafe_allow_html=True)
-                    
-                    # Display included services
-                    for service in package.services:
-                        st.markdown(f"""
-                        <div class="service-item">
-                            • {service.name} ({service.category}) - {service.price_rwf:,.0f} RWF
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    st.markdown("</div></div>", unsafe_allow_html=True)
-                    
-                    # Preview included services with images
-                    if package.services:
-                        st.write("Service Previews:")
-                        service_cols = st.columns(3)
-                        for sidx, service in enumerate(package.services):
-                            with service_cols[sidx % 3]:
-                                display_image_safely(service.cover_image)
-                                st.caption(service.name)
-                    
-                    # View Details button
-                    if st.button("View Details", key=f"view_package_{package.package_id}"):
-                        st.session_state.selected_package = package.package_id
-                        st.rerun()
+        def package_card_html(package):
+            package_services = catalog.package_services(package)
+            services = "".join(
+                f'<div class="service-item">• {html.escape(service.name)} ({html.escape(service.category)})'
+                f' - {service.price_rwf:,.0f} RWF</div>'
+                for service in package_services
+            )
+            previews = "".join(
+                f"<figure>{image_tag(service.cover_image, size='thumb') or no_image_html()}"
+                f"<figcaption>{html.escape(service.name)}</figcaption></figure>"
+                for service in package_services
+            )
+            return f"""{image_tag(package.cover_image, size="card") or no_image_html()}
+<div class="package-card">
+<h3>{html.escape(package.name)}</h3>
+<p class="package-price">{package.base_price_rwf:,.0f} RWF</p>
+<p><strong>Category:</strong> {html.escape(package.category)}</p>
+<p><strong>Duration:</strong> {package.duration_days} day{'s' if package.duration_days > 1 else ''}</p>
+<p><strong>Max Guests:</strong> {package.max_guests}</p>
+<p>{html.escape(package.description or "")}</p>
+<div class="included-services">
+<p><strong>Included Services:</strong></p>
+{services}
+</div>
+</div>
+{f'<p>Service Previews:</p><div class="service-previews">{previews}</div>' if previews else ""}"""
+        
+        selected = catalog_grid(
+            "packages", packages, lambda p: p.package_id, package_card_html, columns=2, page_size=6
+        )
+        if selected:
+            st.session_state.selected_package = selected.package_id
+            st.rerun()
     else:
         st.warning("No packages found.")
 
 def service_details_page(service_id):
+    session = get_session()
     # Back button
     if st.button("← Back to Services"):
         del st.session_state.selected_service
@@ -994,7 +1360,7 @@ def service_details_page(service_id):
         
         # Display cover image
         if service.cover_image:
-            st.image(service.cover_image, use_container_width=True)
+            display_image_safely(service.cover_image, size="detail")
         
         # Display gallery images in tabs
         if service.images:
@@ -1002,7 +1368,7 @@ def service_details_page(service_id):
             gallery_cols = st.columns(3)
             for idx, image in enumerate(service.images):
                 with gallery_cols[idx % 3]:
-                    st.image(image.image_path, use_container_width=True)
+                    display_image_safely(image.image_path, size="card")
                     if image.caption:
                         st.caption(image.caption)
         
@@ -1042,23 +1408,23 @@ def service_details_page(service_id):
             
             special_requests = st.text_area("Special Requests")
             
-            # Calculate and display price breakdown
-            price_per_night = service.price_rwf
-            total_price = price_per_night * nights
+            # The quote shown here is the one booked below
+            quote = quote_service(get_catalog(session).services[service.service_id], start_date, end_date)
             
             st.write("**Price Breakdown:**")
-            st.write(f"Price per night: {price_per_night:,.0f} RWF")
+            if quote.total_rwf == service.price_rwf * nights:
+                st.write(f"Price per night: {service.price_rwf:,.0f} RWF")
+            else:
+                st.write(f"Average per night: {quote.per_night_rwf:,.0f} RWF (seasonal and weekday rates apply)")
             st.write(f"Number of nights: {nights}")
-            st.write(f"**Total Price:** {total_price:,.0f} RWF")
+            st.write(f"**Total Price:** {quote.total_rwf:,.0f} RWF")
             
             if st.button("Book Now"):
                 if guest_count > max_guests:
                     st.error(f"Maximum {max_guests} guests allowed for this service.")
                     return
                 
-                user = session.execute(
-                    select(User).where(User.username == st.session_state.username)
-                ).scalar_one_or_none()
+                user = st.session_state.identity
                 
                 if user:
                     booking = Booking(
@@ -1066,27 +1432,29 @@ def service_details_page(service_id):
                         service_id=service.service_id,
                         start_date=start_date,
                         end_date=end_date,
-                        total_price_rwf=total_price,
+                        total_price_rwf=quote.total_rwf,
                         guest_count=guest_count,
                         special_requests=special_requests,
                         booking_status="pending"
                     )
-                    session.add(booking)
-                    session.commit()
+                    add_booking(booking)
                     st.success("Booking request submitted successfully!")
         else:
             st.warning("Please log in to book this service.")
 
 def package_details_page(package_id):
+    session = get_session()
     # Back button
     if st.button("← Back to Packages"):
         del st.session_state.selected_package
         st.rerun()
     
-    package = session.get(Package, package_id)
+    catalog = get_catalog(session)
+    package = catalog.packages.get(package_id)
     if not package:
         st.error("Package not found!")
         return
+    package_services = catalog.package_services(package)
     
     # Main content in horizontal layout
     col1, col2 = st.columns([2, 1])
@@ -1096,7 +1464,7 @@ def package_details_page(package_id):
         
         # Display cover image
         if package.cover_image:
-            st.image(package.cover_image, use_container_width=True)
+            display_image_safely(package.cover_image, size="detail")
         
         st.write(f"**Category:** {package.category}")
         st.write(f"**Base Price:** {package.base_price_rwf:,.0f} RWF")
@@ -1109,10 +1477,10 @@ def package_details_page(package_id):
         # Services in horizontal grid
         st.subheader("Included Services")
         service_cols = st.columns(3)
-        for idx, service in enumerate(package.services):
+        for idx, service in enumerate(package_services):
             with service_cols[idx % 3]:
                 if service.cover_image:
-                    st.image(service.cover_image, use_container_width=True)
+                    display_image_safely(service.cover_image, size="card")
                     st.markdown(f"""
                     <div class="service-card">
                         <h4>{service.name}</h4>
@@ -1141,15 +1509,10 @@ def package_details_page(package_id):
             special_requests = st.text_area("Special Requests")
             
             # Customizable add-ons if package is customizable
-            selected_services = list(package.services)
+            selected_services = list(package_services)
             if package.is_customizable:
                 st.subheader("Additional Services")
-                add_on_services = session.execute(
-                    select(Service).where(
-                        Service.is_add_on == True,
-                        ~Service.service_id.in_([s.service_id for s in package.services])
-                    )
-                ).scalars().all()
+                add_on_services = catalog.add_ons(set(package.service_ids))
                 
                 # Display add-ons in a grid
                 if add_on_services:
@@ -1157,29 +1520,22 @@ def package_details_page(package_id):
                     for idx, service in enumerate(add_on_services):
                         with addon_cols[idx % 2]:
                             if service.cover_image:
-                                st.image(service.cover_image, use_container_width=True)
+                                display_image_safely(service.cover_image, size="thumb")
                             if st.checkbox(f"Add {service.name} (+{service.price_rwf:,.0f} RWF)"):
                                 selected_services.append(service)
             
-            # Calculate total price
-            total_price = package.base_price_rwf
-            for service in selected_services:
-                if service not in package.services:  # Only add price for additional services
-                    if service.category == "Add-on":
-                        total_price += service.price_rwf * guest_count
-                    else:
-                        total_price += service.price_rwf
-            
-            st.write(f"**Total Price:** {total_price:,.0f} RWF")
+            # The quote shown here is the one booked below
+            quote = quote_package(package, start_date, guest_count, selected_services)
+            if quote.base_rwf != package.base_price_rwf:
+                st.write(f"Package price for these dates: {quote.base_rwf:,.0f} RWF (seasonal and weekday rates apply)")
+            st.write(f"**Total Price:** {quote.total_rwf:,.0f} RWF")
             
             if st.button("Book Package"):
                 if guest_count > package.max_guests:
                     st.error(f"Maximum {package.max_guests} guests allowed for this package.")
                     return
                 
-                user = session.execute(
-                    select(User).where(User.username == st.session_state.username)
-                ).scalar_one_or_none()
+                user = st.session_state.identity
                 
                 if user:
                     booking = PackageBooking(
@@ -1187,48 +1543,60 @@ def package_details_page(package_id):
                         package_id=package.package_id,
                         start_date=start_date,
                         end_date=end_date,
-                        total_price_rwf=total_price,
+                        total_price_rwf=quote.total_rwf,
                         guest_count=guest_count,
                         special_requests=special_requests,
-                        selected_services=json.dumps([s.service_id for s in selected_services]),
-                        booking_status="pending"
+                        selected_services=json.dumps([service_id for service_id, _, _ in quote.lines]),
+                        booking_status="pending",
+                        service_items=build_service_items(quote.lines)
                     )
-                    session.add(booking)
-                    session.commit()
+                    add_booking(booking)
                     st.success("Package booking request submitted successfully!")
         else:
             st.warning("Please log in to book this package.")
 
 # Update the main application logic
-if st.session_state.authentication_status:
-    st.sidebar.title("Navigation")
-    if st.sidebar.button("Logout"):
-        logout()
-
-    if st.session_state.role == "Admin":
-        page = st.sidebar.radio(
-            "Go to", ["Home", "Packages", "Booking History", "Manage Users", "Manage Services", "Manage Packages"]
-        )
-    else:
-        page = st.sidebar.radio("Go to", ["Home", "Packages", "Booking History"])
+try:
+    was_signed_in = st.session_state.authentication_status
+    if current_identity(get_session()):
+        st.sidebar.title("Navigation")
+        if st.sidebar.button("Logout"):
+            logout()
 
-    if page == "Home":
-        if hasattr(st.session_state, 'selected_service'):
-            service_details_page(st.session_state.selected_service)
-        else:
-            home_page()
-    elif page == "Packages":
-        if hasattr(st.session_state, 'selected_package'):
-            package_details_page(st.session_state.selected_package)
+        if st.session_state.role == "Admin":
+            page = st.sidebar.radio(
+                "Go to", ["Home", "Packages", "Booking History", "Booking Console", "Manage Users", "Manage Services",
+                          "Manage Packages"]
+            )
         else:
-            packages_page()
-    elif page == "Booking History":
-        booking_history_page()
-    elif page == "Manage Users":
-        user_management_page()
-    elif page == "Manage Services":
-        service_management_page()
-    elif page == "Manage Packages":
-        package_management_page()
-else:
-    login() 
\ No newline at end of file
+            page = st.sidebar.radio("Go to", ["Home", "Packages", "Booking History"])
+
+        if page == "Home":
+            if hasattr(st.session_state, 'selected_service'):
+                service_details_page(st.session_state.selected_service)
+            else:
+                home_page()
+        elif page == "Packages":
+            if hasattr(st.session_state, 'selected_package'):
+                package_details_page(st.session_state.selected_package)
+            else:
+                packages_page()
+        elif page == "Booking History":
+            booking_history_page()
+        elif page == "Booking Console":
+            booking_console_page()
+        elif page == "Manage Users":
+            user_management_page()
+        elif page == "Manage Services":
+            service_management_page()
+        elif page == "Manage Packages":
+            package_management_page()
+    else:
+        if was_signed_in:
+            # Account disabled or deleted since login (or a session from before identities)
+            sign_out()
+            st.warning("Your session has ended. Please log in again.")
+        login()
+finally:
+    # Release this run's session back to the pool (also runs on st.rerun/st.stop)
+    close_session()
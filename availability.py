@@ -0,0 +1,197 @@
+# availability.py
+"""In-memory index of approved booking ranges, used to answer room availability.
+
+Each service keeps its approved (start_date, end_date) ranges sorted by start,
+plus a running maximum of end dates. "Does anything overlap [start, end]?" is
+then a bisect for the last range starting on or before `end` and one lookup of
+the largest end date up to it, i.e. O(log n) per service with no table scan.
+
+The index is built once per process and kept current by calling
+`AvailabilityIndex.sync_booking()` once a booking's approval, rejection or
+cancellation is committed (booking_writes does this on the write queue).
+Overlap semantics match the SQL path: ranges are inclusive on both ends.
+"""
+import random
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+import streamlit as st
+from sqlalchemy import select
+
+from database import session_scope
+from inventory import available_services_stmt
+from models import Booking, Service
+
+
+class ServiceIntervals:
+    """Approved ranges of one service, sorted by (start, booking_id)."""
+
+    __slots__ = ("keys", "ends", "max_ends")
+
+    def __init__(self):
+        self.keys = []      # (start_date, booking_id), sorted
+        self.ends = []      # end_date, parallel to keys
+        self.max_ends = []  # max(ends[:i + 1])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _refresh_max_ends(self, pos):
+        del self.max_ends[pos:]
+        running = self.max_ends[pos - 1] if pos else None
+        for end in self.ends[pos:]:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+
+    def add(self, booking_id, start, end):
+        key = (start, booking_id)
+        pos = bisect_left(self.keys, key)
+        self.keys.insert(pos, key)
+        self.ends.insert(pos, end)
+        self._refresh_max_ends(pos)
+
+    def remove(self, booking_id, start):
+        pos = bisect_left(self.keys, (start, booking_id))
+        if pos < len(self.keys) and self.keys[pos] == (start, booking_id):
+            del self.keys[pos]
+            del self.ends[pos]
+            self._refresh_max_ends(pos)
+
+    def overlaps(self, start, end):
+        # Ranges starting on or before `end` are keys[:pos]; one of them
+        # overlaps iff the latest end among them reaches `start`.
+        pos = bisect_right(self.keys, (end, float("inf")))
+        return pos > 0 and self.max_ends[pos - 1] >= start
+
+
+class AvailabilityIndex:
+    """Process-wide availability index over approved service bookings."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._services = {}  # service_id -> ServiceIntervals
+        self._bookings = {}  # booking_id -> (service_id, start_date, end_date)
+
+    def build(self, session):
+        rows = session.execute(
+            select(Booking.booking_id, Booking.service_id, Booking.start_date, Booking.end_date)
+            .where(Booking.booking_status == "approved")
+            .order_by(Booking.service_id, Booking.start_date)
+        ).all()
+        services, bookings = {}, {}
+        for booking_id, service_id, start, end in rows:
+            intervals = services.setdefault(service_id, ServiceIntervals())
+            intervals.keys.append((start, booking_id))
+            intervals.ends.append(end)
+            bookings[booking_id] = (service_id, start, end)
+        for intervals in services.values():
+            order = sorted(range(len(intervals.keys)), key=intervals.keys.__getitem__)
+            intervals.keys = [intervals.keys[i] for i in order]
+            intervals.ends = [intervals.ends[i] for i in order]
+            intervals._refresh_max_ends(0)
+        with self._lock:
+            self._services, self._bookings = services, bookings
+
+    def _add(self, booking_id, service_id, start, end):
+        self._services.setdefault(service_id, ServiceIntervals()).add(booking_id, start, end)
+        self._bookings[booking_id] = (service_id, start, end)
+
+    def _remove(self, booking_id):
+        entry = self._bookings.pop(booking_id, None)
+        if entry:
+            service_id, start, _ = entry
+            self._services[service_id].remove(booking_id, start)
+
+    def sync_booking(self, booking_id, service_id=None, start=None, end=None, status=None):
+        """Bring one booking's entry in line with its current state.
+
+        Approved bookings are (re)inserted; any other status, or a deleted
+        booking (status=None), drops the entry.
+        """
+        with self._lock:
+            self._remove(booking_id)
+            if status == "approved":
+                self._add(booking_id, service_id, start, end)
+
+    def drop_service(self, service_id):
+        with self._lock:
+            intervals = self._services.pop(service_id, None)
+            for _, booking_id in intervals.keys if intervals else ():
+                self._bookings.pop(booking_id, None)
+
+    def is_available(self, service_id, start, end):
+        with self._lock:
+            intervals = self._services.get(service_id)
+            return not (intervals and intervals.overlaps(start, end))
+
+    def available_ids(self, service_ids, start, end):
+        with self._lock:
+            return [
+                service_id for service_id in service_ids
+                if not ((intervals := self._services.get(service_id)) and intervals.overlaps(start, end))
+            ]
+
+    def filter_available(self, services, start, end):
+        """Keep the services (anything with a service_id) that are free for [start, end]."""
+        free = set(self.available_ids([s.service_id for s in services], start, end))
+        return [s for s in services if s.service_id in free]
+
+
+@st.cache_resource
+def get_availability_index():
+    index = AvailabilityIndex()
+    with session_scope() as session:
+        index.build(session)
+    return index
+
+
+# --- SQL reference path and consistency check ------------------------------
+
+def sql_available_service_ids(session, start_date, end_date, category=None):
+    """Service IDs free for the range, computed by the original NOT IN scan."""
+    stmt = select(Service.service_id)
+    if category and category != "All":
+        stmt = stmt.where(Service.category == category)
+    booked_services_stmt = select(Service.service_id).join(Booking).where(
+        Booking.start_date <= end_date,
+        Booking.end_date >= start_date,
+        Booking.booking_status == "approved",
+    )
+    stmt = stmt.where(~Service.service_id.in_(booked_services_stmt))
+    return set(session.execute(stmt).scalars())
+
+
+def check_consistency(session, index, start_date, end_date, category=None):
+    """Compare the index with the SQL path for one query.
+
+    Returns (missing, extra): IDs the SQL path reports free but the index does
+    not, and IDs the index reports free but SQL does not. Both empty == consistent.
+    """
+    stmt = select(Service.service_id)
+    if category and category != "All":
+        stmt = stmt.where(Service.category == category)
+    candidates = session.execute(stmt).scalars().all()
+    from_index = set(index.available_ids(candidates, start_date, end_date))
+    from_sql = sql_available_service_ids(session, start_date, end_date, category)
+    return from_sql - from_index, from_index - from_sql
+
+
+if __name__ == "__main__":
+    # Randomised check of a freshly built index and the room-night calendar
+    # against the SQL path
+    index = AvailabilityIndex()
+    failures = 0
+    with session_scope() as session:
+        index.build(session)
+        categories = [None] + list(session.execute(select(Service.category).distinct()).scalars())
+        for _ in range(500):
+            start = date.today() + timedelta(days=random.randint(-400, 400))
+            end = start + timedelta(days=random.randint(0, 30))
+            category = random.choice(categories)
+            missing, extra = check_consistency(session, index, start, end, category)
+            calendar = {s.service_id for s in session.execute(available_services_stmt(start, end, category)).scalars()}
+            if missing or extra or calendar != sql_available_service_ids(session, start, end, category):
+                failures += 1
+                print(f"Mismatch {start}..{end} ({category}): missing={missing} extra={extra} calendar={calendar}")
+    print(f"{500 - failures}/500 queries consistent")
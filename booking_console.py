@@ -0,0 +1,102 @@
+# booking_console.py
+"""The admin booking console: every booking in one table.
+
+load_console() reads service and package bookings with one UNION ALL query
+into a DataFrame (one row per booking, with the guest and item names joined
+in). bulk_update_bookings() only acts on pending bookings, so the page puts
+those in st.data_editor, with only the status column editable, and shows
+the rest read-only. status_edits() diffs the edited table against the
+loaded one, and apply_status_edits() turns the diff into one
+bulk_update_bookings() call per (type, new status), so a whole batch of
+edits costs a handful of transactions however many rows changed.
+"""
+import pandas as pd
+from sqlalchemy import literal, select, union_all
+
+from booking_writes import bulk_update_bookings
+from models import Booking, Package, PackageBooking, Service, User
+
+CONSOLE_MAX_ROWS = 20000
+
+BOOKING_MODELS = {"Service": Booking, "Package": PackageBooking}
+# New status chosen in the console -> bulk action. "cancelled" deletes the booking.
+STATUS_ACTIONS = {"approved": "approve", "rejected": "reject", "cancelled": "cancel"}
+CONSOLE_STATUSES = ["pending", *STATUS_ACTIONS]
+
+
+def filter_bookings(stmt, model, filters):
+    """Apply the admin history filters to a Booking/PackageBooking select, in SQL."""
+    if filters.get("status", "All") != "All":
+        stmt = stmt.where(model.booking_status == filters["status"])
+    if filters.get("item_id"):
+        item_column = model.service_id if model is Booking else model.package_id
+        stmt = stmt.where(item_column == filters["item_id"])
+    if filters.get("username"):
+        stmt = stmt.where(model.user_id.in_(select(User.user_id).where(User.username == filters["username"])))
+    if filters.get("start_date") and filters.get("end_date"):
+        # Stays overlapping the chosen range
+        stmt = stmt.where(model.start_date <= filters["end_date"], model.end_date >= filters["start_date"])
+    return stmt
+
+
+def _console_select(kind, filters):
+    model = BOOKING_MODELS[kind]
+    if model is Booking:
+        item, join_on = Service, Service.service_id == Booking.service_id
+    else:
+        item, join_on = Package, Package.package_id == PackageBooking.package_id
+    stmt = (
+        select(
+            literal(kind).label("kind"),
+            model.booking_id.label("booking_id"),
+            User.username.label("username"),
+            User.full_name.label("full_name"),
+            User.phone_number.label("phone_number"),
+            item.name.label("item"),
+            model.start_date.label("start_date"),
+            model.end_date.label("end_date"),
+            model.guest_count.label("guests"),
+            model.total_price_rwf.label("total_price_rwf"),
+            model.booking_status.label("status"),
+            model.booking_timestamp.label("booked_at"),
+            model.special_requests.label("special_requests"),
+        )
+        .outerjoin(User, User.user_id == model.user_id)
+        .outerjoin(item, join_on)
+    )
+    return filter_bookings(stmt, model, filters)
+
+
+def load_console(session, kinds, filters, max_rows=CONSOLE_MAX_ROWS):
+    """(DataFrame of the matching bookings, newest first; True if cut at max_rows)."""
+    parts = [_console_select(kind, filters) for kind in kinds]
+    rows = parts[0].subquery() if len(parts) == 1 else union_all(*parts).subquery()
+    result = session.execute(
+        select(rows).order_by(rows.c.booked_at.desc(), rows.c.booking_id.desc()).limit(max_rows + 1)
+    )
+    frame = pd.DataFrame(result.all(), columns=list(result.keys()))
+    return frame.head(max_rows), len(frame) > max_rows
+
+
+def status_edits(original, edited):
+    """Rows whose status was changed in the editor: kind, booking_id, old and new status."""
+    changed = edited["status"] != original["status"]
+    return pd.DataFrame({
+        "kind": original.loc[changed, "kind"],
+        "booking_id": original.loc[changed, "booking_id"],
+        "old_status": original.loc[changed, "status"],
+        "status": edited.loc[changed, "status"],
+    })
+
+
+def apply_status_edits(changes):
+    """Apply a status_edits() diff, one bulk transaction per (type, new status).
+
+    Returns a report DataFrame with the outcome for every changed booking.
+    """
+    report = []
+    for (kind, status), group in changes.groupby(["kind", "status"], sort=False):
+        booking_ids = [int(booking_id) for booking_id in group["booking_id"]]
+        outcomes = bulk_update_bookings(BOOKING_MODELS[kind], booking_ids, STATUS_ACTIONS[status])
+        report += [(kind, booking_id, outcome) for booking_id, outcome in outcomes.items()]
+    return pd.DataFrame(report, columns=["Type", "Booking", "Outcome"])
@@ -0,0 +1,146 @@
+# booking_writes.py
+"""Booking writes, committed through the group-commit write queue.
+
+Each function queues one operation and waits for the group it was committed
+with. Status changes keep the room-night calendar in step (inventory.py),
+and the availability index is synced on the writer thread after the commit,
+in commit order.
+"""
+from sqlalchemy import delete, select, update
+
+from availability import get_availability_index
+from inventory import cancel_booking, reserve_bookings, set_booking_status
+from models import Booking, PackageBooking, PackageBookingService, RoomNight
+from user_stats import refresh_user_stats
+from write_queue import get_write_queue
+
+# Bulk action -> new booking_status (None: the booking is deleted)
+BULK_ACTIONS = {"approve": "approved", "reject": "rejected", "cancel": None}
+
+
+class BookingNotFound(LookupError):
+    """The booking was cancelled or deleted in the meantime."""
+
+
+def _get(session, model, booking_id):
+    booking = session.get(model, booking_id)
+    if booking is None:
+        raise BookingNotFound(booking_id)
+    return booking
+
+
+def _sync_index(state):
+    get_availability_index().sync_booking(*state)
+
+
+def add_booking(booking):
+    """Insert a new (transient) Booking or PackageBooking. Returns its booking_id."""
+    def op(session):
+        session.add(booking)
+        session.flush()
+        return booking.booking_id
+    return get_write_queue().run(op)
+
+
+def change_booking_status(booking_id, status):
+    """Raises RoomConflict if approving would double-book, BookingNotFound if it is gone."""
+    def op(session):
+        booking = _get(session, Booking, booking_id)
+        set_booking_status(session, booking, status)
+        return booking.booking_id, booking.service_id, booking.start_date, booking.end_date, booking.booking_status
+    get_write_queue().run(op, on_commit=_sync_index)
+
+
+def remove_booking(booking_id):
+    def op(session):
+        cancel_booking(session, _get(session, Booking, booking_id))
+        return (booking_id,)
+    get_write_queue().run(op, on_commit=_sync_index)
+
+
+def change_package_booking_status(booking_id, status):
+    def op(session):
+        _get(session, PackageBooking, booking_id).booking_status = status
+    get_write_queue().run(op)
+
+
+def remove_package_booking(booking_id):
+    def op(session):
+        session.delete(_get(session, PackageBooking, booking_id))
+    get_write_queue().run(op)
+
+
+def _sync_states(states):
+    index = get_availability_index()
+    for state in states:
+        index.sync_booking(*state)
+
+
+def bulk_update_bookings(model, booking_ids, action):
+    """Approve, reject or cancel many pending bookings in one transaction.
+
+    `model` is Booking or PackageBooking. Bookings that are no longer pending
+    are skipped. For service bookings, approval checks the whole batch against
+    the room-night calendar at once. Earlier bookings win over later ones
+    that overlap them. The status change is one UPDATE/DELETE ... WHERE
+    booking_id IN (...). Returns {booking_id: outcome text}.
+    """
+    status = BULK_ACTIONS[action]
+    booking_ids = list(dict.fromkeys(booking_ids))
+    is_service = model is Booking
+
+    def op(session):
+        columns = [model.booking_id, model.user_id, model.booking_status]
+        if is_service:
+            columns += [Booking.service_id, Booking.start_date, Booking.end_date]
+        rows = session.execute(
+            select(*columns).where(model.booking_id.in_(booking_ids))
+            .order_by(model.booking_timestamp, model.booking_id)
+        ).all()
+
+        outcomes = dict.fromkeys(booking_ids, "Not found")
+        pending = []
+        for row in rows:
+            if row.booking_status == "pending":
+                pending.append(row)
+            else:
+                outcomes[row.booking_id] = f"Skipped: already {row.booking_status}"
+
+        if is_service and action == "approve":
+            done, conflicts = reserve_bookings(session, pending)
+            for booking_id, other in conflicts.items():
+                outcomes[booking_id] = (f"Conflict: dates taken by booking {other}" if other is not None
+                                        else "Conflict: the service no longer exists")
+        else:
+            done = [row.booking_id for row in pending]
+        if not done:
+            return outcomes, []
+
+        target = (model.booking_id.in_(done), model.booking_status == "pending")
+        if status is None:
+            if is_service:
+                session.execute(delete(RoomNight).where(RoomNight.booking_id.in_(done)))
+            else:
+                session.execute(delete(PackageBookingService).where(PackageBookingService.package_booking_id.in_(done)))
+            session.execute(delete(model).where(*target).execution_options(synchronize_session=False))
+        else:
+            session.execute(
+                update(model).where(*target).values(booking_status=status)
+                .execution_options(synchronize_session=False)
+            )
+        # Core statements bypass the after_flush hook that maintains the counters
+        done_set = set(done)
+        refresh_user_stats(session.connection(),
+                           {row.user_id for row in pending if row.booking_id in done_set and row.user_id is not None})
+
+        label = {"approve": "Approved", "reject": "Rejected", "cancel": "Cancelled"}[action]
+        states = []
+        for row in pending:
+            if row.booking_id in done_set:
+                outcomes[row.booking_id] = label
+                if is_service:
+                    states.append((row.booking_id, row.service_id, row.start_date, row.end_date, status))
+        return outcomes, states
+
+    outcomes, _ = get_write_queue().run(op, on_commit=lambda result: _sync_states(result[1]))
+    return outcomes
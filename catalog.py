@@ -0,0 +1,125 @@
+# catalog.py
+"""Versioned, process-wide cache of the service and package catalog.
+
+The catalog changes only when an admin edits services or packages, but the
+customer pages read it on every rerun. get_catalog() hands out an immutable
+snapshot shared by all sessions; the only per-rerun cost is reading the
+single-row catalog_version stamp. Admin writes call bump_catalog_version()
+inside their transaction, so every process sees the new version on its next
+read and reloads exactly once.
+"""
+import threading
+from dataclasses import dataclass
+
+import streamlit as st
+from sqlalchemy import insert, select, update
+
+from models import CatalogVersion, Package, Service, package_services
+
+
+@dataclass(frozen=True)
+class ServiceInfo:
+    service_id: int
+    name: str
+    category: str
+    description: str
+    price_rwf: float
+    size: str
+    details: str
+    cover_image: str
+    max_capacity: int
+    is_add_on: bool
+
+
+@dataclass(frozen=True)
+class PackageInfo:
+    package_id: int
+    name: str
+    description: str
+    base_price_rwf: float
+    category: str
+    duration_days: int
+    max_guests: int
+    is_customizable: bool
+    cover_image: str
+    service_ids: tuple
+
+
+@dataclass(frozen=True)
+class Catalog:
+    version: int
+    services: dict  # service_id -> ServiceInfo, in service_id order
+    packages: dict  # package_id -> PackageInfo, in package_id order
+
+    def services_in(self, category=None):
+        return [s for s in self.services.values() if not category or category == "All" or s.category == category]
+
+    def packages_in(self, category=None):
+        return [p for p in self.packages.values() if not category or category == "All" or p.category == category]
+
+    def package_services(self, package):
+        return [self.services[i] for i in package.service_ids if i in self.services]
+
+    def add_ons(self, exclude_ids=()):
+        return [s for s in self.services.values() if s.is_add_on and s.service_id not in exclude_ids]
+
+
+def current_version(session):
+    return session.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1)).scalar() or 0
+
+
+def bump_catalog_version(session):
+    """Invalidate every cached catalog. Call in the same transaction as the write."""
+    result = session.execute(update(CatalogVersion).where(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1))
+    if result.rowcount == 0:
+        session.execute(insert(CatalogVersion).values(id=1, version=1))
+
+
+def load_catalog(session, version):
+    links = {}
+    for package_id, service_id in session.execute(
+        select(package_services.c.package_id, package_services.c.service_id).order_by(package_services.c.service_id)
+    ):
+        links.setdefault(package_id, []).append(service_id)
+
+    services = {
+        s.service_id: ServiceInfo(
+            s.service_id, s.name, s.category, s.description, s.price_rwf, s.size, s.details,
+            s.cover_image, s.max_capacity, bool(s.is_add_on),
+        )
+        for s in session.execute(select(Service).order_by(Service.service_id)).scalars()
+    }
+    packages = {
+        p.package_id: PackageInfo(
+            p.package_id, p.name, p.description, p.base_price_rwf, p.category, p.duration_days,
+            p.max_guests, bool(p.is_customizable), p.cover_image, tuple(links.get(p.package_id, ())),
+        )
+        for p in session.execute(select(Package).order_by(Package.package_id)).scalars()
+    }
+    return Catalog(version, services, packages)
+
+
+class CatalogCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalog = None
+
+    def get(self, session):
+        version = current_version(session)
+        catalog = self._catalog
+        if catalog is not None and catalog.version == version:
+            return catalog
+        with self._lock:
+            if self._catalog is None or self._catalog.version != version:
+                self._catalog = load_catalog(session, version)
+            return self._catalog
+
+
+@st.cache_resource
+def get_catalog_cache():
+    return CatalogCache()
+
+
+def get_catalog(session):
+    """The current catalog snapshot (reloaded only when the version changed)."""
+    return get_catalog_cache().get(session)
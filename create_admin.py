@@ -1,23 +1,24 @@
 # create_admin.py  !!!RUN THIS ONLY ONCE!!!!
-import sqlite3
 import bcrypt
 from sqlalchemy import select
 from models import User, Base
 from database import get_engine, get_session
 
+ADMIN_USERNAME = "Belise"  ### admin user name it can be whatever you want
+
 def create_initial_admin():
     session = get_session()
 
     # Check if admin exists
     admin_exists = session.execute(
-        select(User).where(User.username == "belise") ### admin user name it can be whatever you want 
+        select(User).where(User.username == ADMIN_USERNAME)
     ).scalar_one_or_none()
 
     if admin_exists is None:
         print("Creating admin user...")
         hashed_password = bcrypt.hashpw("123".encode(), bcrypt.gensalt()) ### admin password it can be whatever you want
         admin = User(
-            username="Belise", ### change also this 
+            username=ADMIN_USERNAME,
             hashed_password=hashed_password,
             role="Admin",
             full_name="Admin2 Administrator",
@@ -1,17 +1,159 @@
 # db.py
+import os
+from contextlib import contextmanager
+
 import streamlit as st
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import scoped_session, sessionmaker
 from models import Base
+from migrations import run_migrations
+from user_stats import install_user_stats_listener
+
+# Engine settings come from the environment (or a .env file next to the app):
+#   DATABASE_URL            default sqlite:///hotel_booking.db, e.g. postgresql+psycopg://user:pw@host/db
+#   DB_POOL_SIZE            pooled connections kept open (default 5)
+#   DB_MAX_OVERFLOW         extra connections allowed under burst (default 10)
+#   DB_POOL_TIMEOUT         seconds to wait for a free connection (default 30)
+#   DB_POOL_RECYCLE         recycle connections older than this many seconds (default 1800, -1 = never)
+#   SQLITE_JOURNAL_MODE     default WAL
+#   SQLITE_SYNCHRONOUS      default NORMAL
+#   SQLITE_BUSY_TIMEOUT_MS  default 5000
+#   SQLITE_CACHE_SIZE       default -65536 (negative = KiB, so 64 MiB)
+#   SQLITE_MMAP_SIZE        default 268435456 (256 MiB)
+load_dotenv()
+
+DEFAULT_DATABASE_URL = "sqlite:///hotel_booking.db"
+
+
+def env_int(name, default):
+    """Integer setting from the environment; `default` if unset or not a number."""
+    try:
+        return int(os.getenv(name, ""))
+    except ValueError:
+        return default
+
+
+def load_engine_profile():
+    """Read the engine profile from the environment."""
+    return {
+        "url": os.getenv("DATABASE_URL") or DEFAULT_DATABASE_URL,
+        "pool_size": env_int("DB_POOL_SIZE", 5),
+        "max_overflow": env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": env_int("DB_POOL_RECYCLE", 1800),
+        "sqlite_pragmas": {
+            "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+            "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "busy_timeout": env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+            "cache_size": env_int("SQLITE_CACHE_SIZE", -65536),
+            "mmap_size": env_int("SQLITE_MMAP_SIZE", 268435456),
+        },
+    }
+
+
+def _install_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def begin_sqlite_transaction(conn):
+        # Only connections from writer_engine() carry this option
+        mode = conn.get_execution_options().get("sqlite_begin")
+        if mode:
+            conn.exec_driver_sql(f"BEGIN {mode}")
+
+
+def writer_engine(engine):
+    """The engine the write queue commits through.
+
+    pysqlite only opens a transaction before INSERT/UPDATE/DELETE, so a
+    SAVEPOINT issued first starts (and its RELEASE commits) a transaction of
+    its own. On SQLite the writer therefore takes transaction control away
+    from the driver and opens it itself with BEGIN IMMEDIATE, so savepoints
+    nest inside one real transaction that holds the write lock from the
+    start. Page sessions keep the driver's deferred transactions: their
+    reads take no snapshot, and their first write waits on busy_timeout.
+    The pool restores the driver's isolation level on checkin.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+    return engine.execution_options(isolation_level="AUTOCOMMIT", sqlite_begin="IMMEDIATE")
+
+
+def build_engine(profile=None):
+    """Create an engine from a profile (defaults to load_engine_profile())."""
+    profile = profile or load_engine_profile()
+    url = make_url(profile["url"])
+    in_memory_sqlite = url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+    kwargs = {"pool_pre_ping": True}
+    if not in_memory_sqlite:
+        # In-memory SQLite uses a SingletonThreadPool, which takes no sizing arguments
+        kwargs.update(
+            pool_size=profile["pool_size"],
+            max_overflow=profile["max_overflow"],
+            pool_timeout=profile["pool_timeout"],
+            pool_recycle=profile["pool_recycle"],
+        )
+
+    engine = create_engine(url, **kwargs)
+    if url.get_backend_name() == "sqlite":
+        _install_sqlite_pragmas(engine, profile["sqlite_pragmas"])
+    return engine
+
 
 @st.cache_resource
 def get_engine():
-    engine = create_engine("sqlite:///hotel_booking.db")  # or full path if you want
+    engine = build_engine()
     Base.metadata.create_all(engine)
+    run_migrations(engine)
     return engine
 
 @st.cache_resource
+def get_session_factory():
+    # One registry per process, but every script-run thread gets its own
+    # Session (and pooled connection) out of it. Streamlit runs each rerun
+    # on a ScriptRunner thread, so thread-local scoping == per-run scoping
+    # as long as close_session() is called when the run ends.
+    factory = sessionmaker(bind=get_engine())
+    install_user_stats_listener(factory)
+    return scoped_session(factory)
+
+@st.cache_resource
+def get_writer_session_factory():
+    """Session factory for the write queue's thread, bound to writer_engine()."""
+    factory = sessionmaker(bind=writer_engine(get_engine()))
+    install_user_stats_listener(factory)
+    return factory
+
 def get_session():
-    engine = get_engine()
-    Session = sessionmaker(bind=engine)
-    return Session()
+    """Return the Session for the current script run (created on first use)."""
+    return get_session_factory()()
+
+def close_session():
+    """Close the current run's Session and hand its connection back to the pool."""
+    get_session_factory().remove()
+
+@contextmanager
+def session_scope():
+    """Standalone session for code outside a script run (CLIs, worker threads).
+
+    Commits on success, rolls back on error and always closes.
+    """
+    session = get_session_factory().session_factory()
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,146 @@
+# gallery_uploads.py
+"""Background processing of multi-image gallery uploads.
+
+start_gallery_upload() returns as soon as the files are read. Worker threads
+validate each image, write it to the image store and build its renditions
+(Pillow releases the GIL while decoding and resizing, so they run in
+parallel). When every file is done, one transaction adds the ServiceImage
+rows for the files that succeeded. Pages poll the returned batch for progress
+and per-file failures.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import streamlit as st
+from PIL import Image, UnidentifiedImageError
+
+from database import env_int, session_scope
+from image_store import save_stream, write_stream
+from images import generate_renditions, media_root
+from models import Service, ServiceImage
+
+logger = logging.getLogger(__name__)
+
+# Finished batches nobody looked at are dropped after this long
+BATCH_TTL_SECONDS = 3600
+
+
+@st.cache_resource
+def get_upload_executor():
+    return ThreadPoolExecutor(max_workers=max(1, env_int("GALLERY_UPLOAD_WORKERS", min(4, os.cpu_count() or 1))), thread_name_prefix="gallery-upload")
+
+
+@st.cache_resource
+def get_upload_batches():
+    """batch_id -> UploadBatch, shared by all sessions of this process."""
+    return {}
+
+
+class UploadBatch:
+    def __init__(self, service_id, names, caption):
+        self.id = uuid.uuid4().hex
+        self.service_id = service_id
+        self.names = names
+        self.caption = caption
+        self.processed = 0
+        self.added = 0
+        self.failures = {}  # file name -> reason
+        self.error = None   # set when the final transaction failed
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def total(self):
+        return len(self.names)
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def _file_done(self, name=None, reason=None):
+        with self._lock:
+            self.processed += 1
+            if reason is not None:
+                self.failures[name] = reason
+
+
+def _process(uploaded_file):
+    """Validate, store and resize one image. Runs in a worker thread."""
+    ext = Path(uploaded_file.name).suffix.lower()
+    stored = write_stream(uploaded_file, ext)  # size and pixel limits
+    with Image.open(os.path.join(media_root(), stored[1])) as image:
+        image.verify()  # structure check
+    generate_renditions(stored[1])
+    return ext, stored
+
+
+def _run(batch, files):
+    try:
+        executor = get_upload_executor()
+        futures = {executor.submit(_process, f): index for index, f in enumerate(files)}
+        stored = []
+        for future in as_completed(futures):
+            index = futures[future]
+            name = files[index].name
+            try:
+                ext, result = future.result()
+            except UnidentifiedImageError:
+                batch._file_done(name, "Not a readable image file.")
+            except Exception as e:
+                # Anything one file raises only fails that file; Pillow reports
+                # some corrupt images as SyntaxError (e.g. a bad PNG checksum)
+                batch._file_done(name, str(e) or type(e).__name__)
+            else:
+                stored.append((index, ext, result))
+                batch._file_done()
+
+        # Keep the gallery in upload order
+        stored.sort()
+        if stored:
+            with session_scope() as session:
+                if session.get(Service, batch.service_id) is None:
+                    raise ValueError("The service was deleted while its images were processing.")
+                for index, ext, result in stored:
+                    # The file is already on disk; this only counts the reference
+                    path = save_stream(session, files[index], ext, stored=result)
+                    session.add(ServiceImage(service_id=batch.service_id, image_path=path, caption=batch.caption))
+            batch.added = len(stored)
+    except Exception as e:
+        logger.exception("Gallery upload %s failed", batch.id)
+        batch.error = str(e)
+    finally:
+        batch.finished_at = time.monotonic()
+
+
+def _prune(batches):
+    cutoff = time.monotonic() - BATCH_TTL_SECONDS
+    for batch_id, batch in list(batches.items()):
+        if batch.finished and batch.finished_at < cutoff:
+            batches.pop(batch_id, None)
+
+
+def start_gallery_upload(service_id, uploaded_files, caption=""):
+    """Queue uploaded files for `service_id` and return the UploadBatch tracking them."""
+    # The UploadedFile buffers are Streamlit's; workers stream from them without copying
+    files = list(uploaded_files)
+    for f in files:
+        f.seek(0)
+    batch = UploadBatch(service_id, [f.name for f in files], caption)
+    batches = get_upload_batches()
+    _prune(batches)
+    batches[batch.id] = batch
+    threading.Thread(target=_run, args=(batch, files), name=f"gallery-batch-{batch.id[:8]}", daemon=True).start()
+    return batch
+
+
+def get_upload_batch(batch_id):
+    return get_upload_batches().get(batch_id)
+
+
+def forget_upload_batch(batch_id):
+    get_upload_batches().pop(batch_id, None)
@@ -0,0 +1,78 @@
+# identity.py
+"""The signed-in user, cached in st.session_state.
+
+Login stores a small immutable Identity once. Later reruns don't look the
+user up by username again: they read the single auth_version column by
+primary key and compare it with the cached stamp. Admins bump the stamp
+(bump_auth_version) when they disable or enable an account, and a deleted
+account has no stamp at all. Either way, the next rerun reloads the
+identity or signs the session out.
+"""
+from dataclasses import dataclass
+
+import streamlit as st
+from sqlalchemy import select, update
+
+from models import User
+
+
+@dataclass(frozen=True)
+class Identity:
+    user_id: int
+    username: str
+    role: str
+    full_name: str
+    is_active: bool
+    auth_version: int
+
+
+def identity_from_user(user, role):
+    return Identity(user.user_id, user.username, role, user.full_name, bool(user.is_active), user.auth_version or 0)
+
+
+def may_sign_in(user, role):
+    # Disabled accounts are only locked out of the User role, as at login
+    return user is not None and user.role == role and (role != "User" or user.is_active)
+
+
+def bump_auth_version(session, user_id):
+    """Invalidate cached identities of this user. Call in the same transaction as the change."""
+    session.execute(update(User).where(User.user_id == user_id).values(auth_version=User.auth_version + 1))
+
+
+def sign_in(user, role):
+    identity = identity_from_user(user, role)
+    st.session_state.identity = identity
+    st.session_state.authentication_status = True
+    st.session_state.username = identity.username
+    st.session_state.role = role
+    return identity
+
+
+def sign_out():
+    st.session_state.identity = None
+    st.session_state.authentication_status = None
+    st.session_state.username = None
+    st.session_state.role = None
+
+
+def current_identity(session):
+    """The cached Identity, revalidated against auth_version; None if signed out.
+
+    Signs the session out when the account was deleted or may no longer sign in.
+    """
+    identity = st.session_state.get("identity")
+    if identity is None:
+        return None
+    # Matching the username too keeps a reused user_id from inheriting the session
+    version = session.execute(
+        select(User.auth_version).where(User.user_id == identity.user_id, User.username == identity.username)
+    ).scalar()
+    if version == identity.auth_version:
+        return identity
+
+    user = session.get(User, identity.user_id) if version is not None else None
+    if not may_sign_in(user, identity.role):
+        sign_out()
+        return None
+    return sign_in(user, identity.role)
@@ -0,0 +1,81 @@
+# image_cache.py
+"""Process-wide LRU cache of image file bytes.
+
+Pages show the same covers on every rerun, for every session. The bundled
+image server (static_images.py, IMAGE_SERVER_PORT) answers from this cache,
+which saves the disk read each time. Streamlit's own static serving reads
+files itself and does not use it. Entries are keyed by
+path, mtime and size, so a rewritten file is never served stale. The cache is
+bounded in bytes (IMAGE_CACHE_MAX_BYTES, default 64 MiB) and evicts the least
+recently used images first.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from database import env_int
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ImagePayloadCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (path, mtime_ns, size) -> bytes
+        self._current = {}             # path -> key of its cached version
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path):
+        """The bytes of the file at `path`, from the cache when it is unchanged."""
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) > self.max_bytes:
+            return data  # would evict everything else
+
+        with self._lock:
+            stale = self._current.get(path)
+            if stale is not None and stale != key:
+                self._bytes -= len(self._entries.pop(stale, b""))
+            if key not in self._entries:
+                self._entries[key] = data
+                self._bytes += len(data)
+            self._current[path] = key
+            while self._bytes > self.max_bytes:
+                old_key, old = self._entries.popitem(last=False)
+                self._bytes -= len(old)
+                if self._current.get(old_key[0]) == old_key:
+                    del self._current[old_key[0]]
+                self.evictions += 1
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+@st.cache_resource
+def get_image_cache():
+    return ImagePayloadCache(max(0, env_int("IMAGE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
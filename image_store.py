@@ -0,0 +1,371 @@
+# image_store.py
+"""Content-addressed, reference-counted store for uploaded images.
+
+Files live at static/images/blobs/<aa>/<sha256><ext> under the media root
+(IMAGE_ROOT, see images.media_root), so identical bytes are stored once no
+matter how many services or packages use them, two uploads can never
+overwrite each other, and nothing is shared through per-record folders.
+Uploads are streamed in fixed-size chunks through a temp file and renamed into
+place, with size and pixel limits (IMAGE_MAX_UPLOAD_BYTES, IMAGE_MAX_PIXELS)
+checked as the bytes arrive.
+
+image_blobs keeps one row per file with a reference count. save/release adjust
+it inside the caller's transaction; a blob whose count reaches zero is removed
+right after that transaction commits. sweep() reconciles files, rows and the
+ServiceImage / Service / Package references in bounded batches.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image, UnidentifiedImageError
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from images import RENDITION_EXT, RENDITIONS, delete_renditions, media_root
+from models import ImageBlob, Package, Service, ServiceImage
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = os.path.join("static", "images", "blobs")
+CHUNK_SIZE = 1024 * 1024
+TEMP_DIR = os.path.join(BLOBS_DIR, "tmp")
+DEFAULT_MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+# Files younger than this are never treated as orphans: their row may belong
+# to a transaction that has not committed yet.
+ORPHAN_GRACE_SECONDS = 3600
+
+RENDITION_SUFFIXES = {f"{size}{RENDITION_EXT}" for size in RENDITIONS}
+
+# (model, column) pairs that hold image paths
+IMAGE_REFERENCES = (
+    (ServiceImage, ServiceImage.image_path),
+    (Service, Service.cover_image),
+    (Package, Package.cover_image),
+)
+
+
+def blob_path(sha256, ext):
+    return Path(BLOBS_DIR, sha256[:2], f"{sha256}{ext.lower()}").as_posix()
+
+
+def is_blob_path(image_path):
+    return bool(image_path) and Path(image_path).as_posix().startswith(BLOBS_DIR + "/")
+
+
+def _full_path(image_path):
+    return os.path.join(media_root(), image_path)
+
+
+def _write_atomically(target, chunks):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _increment(session, sha256):
+    """+1 on an existing blob; returns its path, or None if there is no such blob."""
+    return session.execute(
+        update(ImageBlob).where(ImageBlob.sha256 == sha256)
+        .values(ref_count=ImageBlob.ref_count + 1).returning(ImageBlob.path)
+    ).scalar()
+
+
+def add_reference(session, sha256, ext, size_bytes, write_file):
+    """Count one more reference to a blob, creating it if needed. Returns its path.
+
+    `write_file(full_path)` is called when the file is missing on disk.
+    """
+    path = _increment(session, sha256)
+    if path is None:
+        path = blob_path(sha256, ext)
+        try:
+            with session.begin_nested():
+                session.execute(insert(ImageBlob).values(
+                    sha256=sha256, path=path, size_bytes=size_bytes, ref_count=1
+                ))
+        except IntegrityError:
+            # Another session created it between our UPDATE and INSERT
+            path = _increment(session, sha256)
+    if not os.path.exists(_full_path(path)):
+        write_file(_full_path(path))
+    return path
+
+
+class ImageRejected(ValueError):
+    """An upload that is too large, too many pixels or not an image."""
+
+
+def _check_pixels(source, max_pixels):
+    """True once the image header was read and is within limits; False if it can't be read yet."""
+    try:
+        with Image.open(source) as image:
+            width, height = image.size
+    except Image.DecompressionBombError as e:
+        raise ImageRejected(str(e)) from e
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return False
+    if width * height > max_pixels:
+        raise ImageRejected(f"Image is {width}x{height} pixels; the limit is {max_pixels:,} pixels.")
+    return True
+
+
+def _stream_to_temp(fileobj):
+    """Copy `fileobj` in CHUNK_SIZE pieces to a temp file in the store, checking limits.
+
+    Returns (temp path, sha256, size). Only one chunk is held in memory.
+    """
+    from database import env_int  # database imports this module through migrations
+
+    max_bytes = env_int("IMAGE_MAX_UPLOAD_BYTES", DEFAULT_MAX_UPLOAD_BYTES)
+    max_pixels = env_int("IMAGE_MAX_PIXELS", Image.MAX_IMAGE_PIXELS)
+    temp_dir = _full_path(TEMP_DIR)
+    os.makedirs(temp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=temp_dir, suffix=".tmp")
+    digest, size, header_checked = hashlib.sha256(), 0, False
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageRejected(f"File is larger than the {max_bytes / 2**20:.0f} MiB limit.")
+                if not header_checked:
+                    # The header is almost always in the first chunk
+                    header_checked = _check_pixels(BytesIO(chunk), max_pixels)
+                digest.update(chunk)
+                f.write(chunk)
+        if not header_checked and not _check_pixels(tmp_path, max_pixels):
+            raise ImageRejected("Not a readable image file.")
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+def _rewrite(fileobj, target):
+    fileobj.seek(0)
+    tmp_path, _, _ = _stream_to_temp(fileobj)
+    os.replace(tmp_path, target)
+
+
+def write_stream(fileobj, ext):
+    """Stream `fileobj` into the store without counting a reference.
+
+    Returns (sha256, path, size). The file stays unowned until save_stream()
+    commits a reference to it; if that never happens, sweep() removes it
+    after ORPHAN_GRACE_SECONDS.
+    """
+    tmp_path, sha256, size = _stream_to_temp(fileobj)
+    path = blob_path(sha256, ext)
+    target = _full_path(path)
+    if os.path.exists(target):
+        os.unlink(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+    return sha256, path, size
+
+
+def save_stream(session, fileobj, ext, stored=None):
+    """Store an uploaded file (deduplicated) and count a reference. Returns its path.
+
+    `stored` is write_stream()'s result when the file was already written,
+    e.g. by a worker thread.
+    """
+    sha256, written, size = stored or write_stream(fileobj, ext)
+    path = add_reference(session, sha256, ext, size, lambda target: _rewrite(fileobj, target))
+    if path != written:
+        # The same bytes are already stored under another extension; nothing
+        # will ever point at the copy just written (or its renditions)
+        _remove_files(written)
+    return path
+
+
+def release(session, image_path):
+    """Drop one reference to a stored image. Non-blob (legacy) paths are left alone."""
+    if not is_blob_path(image_path):
+        return
+    session.execute(
+        update(ImageBlob)
+        .where(ImageBlob.path == image_path, ImageBlob.ref_count > 0)
+        .values(ref_count=ImageBlob.ref_count - 1)
+    )
+    session.info.setdefault("released_images", set()).add(image_path)
+
+
+@event.listens_for(Session, "after_commit")
+def _collect_released(session):
+    released = session.info.pop("released_images", None)
+    if released:
+        collect(session.get_bind(), released)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_released(session):
+    session.info.pop("released_images", None)
+
+
+def _remove_files(image_path):
+    try:
+        os.remove(_full_path(image_path))
+    except FileNotFoundError:
+        pass
+    delete_renditions(image_path)
+
+
+def collect(engine, paths=None):
+    """Delete unreferenced blob rows (optionally only among `paths`) and their files."""
+    with engine.begin() as conn:
+        stmt = delete(ImageBlob).where(ImageBlob.ref_count <= 0).returning(ImageBlob.path)
+        if paths is not None:
+            stmt = stmt.where(ImageBlob.path.in_(paths))
+        dead = conn.execute(stmt).scalars().all()
+    for image_path in dead:
+        _remove_files(image_path)
+    return len(dead)
+
+
+# --- reconciliation ----------------------------------------------------------
+
+def _reference_counts(conn, paths):
+    counts = dict.fromkeys(paths, 0)
+    for model, column in IMAGE_REFERENCES:
+        for path, count in conn.execute(
+            select(column, func.count()).where(column.in_(paths)).group_by(column)
+        ):
+            counts[path] += count
+    return counts
+
+
+def _iter_blob_files():
+    """Yield (relative path, os.DirEntry) for every file under BLOBS_DIR, lazily."""
+    root = _full_path(BLOBS_DIR)
+    if not os.path.isdir(root):
+        return
+    with os.scandir(root) as shards:
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            with os.scandir(shard.path) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        yield Path(BLOBS_DIR, shard.name, entry.name).as_posix(), entry
+
+
+def sweep(engine, batch_size=500):
+    """Reconcile the blob store. Memory use is bounded by `batch_size`.
+
+    1. Recompute every blob's ref_count from the referencing rows.
+    2. Delete blobs nobody references, with their files.
+    3. Delete files (and stale temp files) that have no blob row.
+    Returns a dict of counters.
+    """
+    stats = {"recounted": 0, "collected": 0, "orphan_files": 0}
+
+    last = ""
+    while True:
+        with engine.begin() as conn:
+            batch = conn.execute(
+                select(ImageBlob.sha256, ImageBlob.path, ImageBlob.ref_count)
+                .where(ImageBlob.sha256 > last).order_by(ImageBlob.sha256).limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            actual = _reference_counts(conn, [row.path for row in batch])
+            for row in batch:
+                if actual[row.path] != row.ref_count:
+                    conn.execute(update(ImageBlob).where(ImageBlob.sha256 == row.sha256)
+                                 .values(ref_count=actual[row.path]))
+                    stats["recounted"] += 1
+        last = batch[-1].sha256
+
+    stats["collected"] = collect(engine)
+
+    cutoff = time.time() - ORPHAN_GRACE_SECONDS
+
+    def check(entries):
+        candidates = {}
+        for path, entry in entries:
+            name = os.path.basename(path)
+            if name.split(".", 1)[-1] in RENDITION_SUFFIXES:
+                continue  # renditions go with their blob
+            if entry.stat().st_mtime < cutoff:
+                candidates[path] = entry
+        if not candidates:
+            return
+        with engine.connect() as conn:
+            known = set(conn.execute(select(ImageBlob.path).where(ImageBlob.path.in_(candidates))).scalars())
+        for path in candidates.keys() - known:
+            if path.endswith(".tmp"):
+                os.remove(candidates[path].path)
+            else:
+                _remove_files(path)
+            stats["orphan_files"] += 1
+
+    pending = []
+    for item in _iter_blob_files():
+        pending.append(item)
+        if len(pending) >= batch_size:
+            check(pending)
+            pending = []
+    check(pending)
+    return stats
+
+
+def adopt_legacy_images(conn):
+    """Copy images referenced by path under static/images/<id>/ into the blob store.
+
+    Referencing rows are repointed at the blob and the counts set accordingly.
+    The old files are left where they are; missing files are skipped.
+    """
+    legacy = set()
+    for model, column in IMAGE_REFERENCES:
+        legacy.update(p for p in conn.execute(select(column).where(column.is_not(None)).distinct()).scalars()
+                      if p and not is_blob_path(p))
+
+    for old_path in sorted(legacy):
+        full = _full_path(old_path)
+        if not os.path.isfile(full):
+            logger.warning("Legacy image %s is missing; leaving its references as they are", old_path)
+            continue
+        digest = hashlib.sha256()
+        with open(full, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        existing = conn.execute(select(ImageBlob.path).where(ImageBlob.sha256 == sha256)).scalar()
+        new_path = existing or blob_path(sha256, Path(old_path).suffix)
+        if not os.path.exists(_full_path(new_path)):
+            with open(full, "rb") as f:
+                _write_atomically(_full_path(new_path), iter(lambda: f.read(CHUNK_SIZE), b""))
+
+        references = 0
+        for model, column in IMAGE_REFERENCES:
+            references += conn.execute(update(model).where(column == old_path).values({column.key: new_path})).rowcount
+        if existing:
+            conn.execute(update(ImageBlob).where(ImageBlob.sha256 == sha256)
+                         .values(ref_count=ImageBlob.ref_count + references))
+        else:
+            conn.execute(insert(ImageBlob).values(
+                sha256=sha256, path=new_path, size_bytes=os.path.getsize(full), ref_count=references
+            ))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    from database import build_engine
+
+    print(sweep(build_engine()))
@@ -0,0 +1,105 @@
+# images.py
+"""Resized renditions of uploaded images.
+
+Every upload gets a fixed set of downscaled WebP copies next to the original
+(`cover.png` -> `cover.thumb.webp`, `cover.card.webp`, `cover.detail.webp`).
+They are EXIF-rotated and carry no metadata. Pages ask for the smallest size
+that fits the slot they render into, instead of shipping the full photo.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+project_root = os.path.dirname(os.path.abspath(__file__))
+
+
+def media_root():
+    """Directory the stored image paths (static/images/...) are relative to.
+
+    IMAGE_ROOT in the environment, default the app directory. Point it
+    elsewhere to keep another database's images (tests, staging) out of the
+    source tree; Streamlit only serves the app's own static/, so such a root
+    is served by the bundled image server (IMAGE_SERVER_PORT).
+    """
+    return os.path.abspath(os.getenv("IMAGE_ROOT") or project_root)
+
+# Rendition name -> longest edge in pixels, smallest first
+RENDITIONS = {
+    "thumb": 320,   # previews and admin lists (1/3-column grids)
+    "card": 640,    # customer grid cards
+    "detail": 1280, # detail page hero image
+}
+RENDITION_FORMAT = "WEBP"
+RENDITION_EXT = ".webp"
+RENDITION_QUALITY = 80
+
+
+def _full_path(image_path):
+    return image_path if os.path.isabs(image_path) else os.path.join(media_root(), image_path)
+
+
+def rendition_path(image_path, size):
+    """Relative path of a rendition of `image_path` (which may not exist yet)."""
+    path = Path(image_path)
+    return path.with_name(f"{path.stem}.{size}{RENDITION_EXT}").as_posix()
+
+
+def _prepare(image):
+    image = ImageOps.exif_transpose(image)
+    # WebP handles RGB/RGBA; palette, CMYK, 16-bit etc. are converted
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    return image
+
+
+def _save_atomically(image, target):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            # No exif/icc arguments: the rendition carries no metadata
+            image.save(f, RENDITION_FORMAT, quality=RENDITION_QUALITY, method=4)
+        os.replace(tmp_path, target)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def generate_renditions(image_path):
+    """Write every rendition of an image. Returns {size: relative path}."""
+    paths = {}
+    with Image.open(_full_path(image_path)) as original:
+        prepared = _prepare(original)
+        for size, edge in RENDITIONS.items():
+            resized = prepared.copy()
+            resized.thumbnail((edge, edge), Image.Resampling.LANCZOS)  # never upscales
+            target = rendition_path(image_path, size)
+            _save_atomically(resized, _full_path(target))
+            paths[size] = target
+    return paths
+
+
+def best_image_path(image_path, size="card"):
+    """The rendition to display for `image_path` at `size`.
+
+    Images uploaded before renditions existed get them generated on first use;
+    if that fails (unreadable file, unknown format) the original is returned.
+    """
+    if not image_path or size not in RENDITIONS:
+        return image_path
+    target = rendition_path(image_path, size)
+    if not os.path.exists(_full_path(target)):
+        try:
+            generate_renditions(image_path)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return image_path
+    return target
+
+
+def delete_renditions(image_path):
+    for size in RENDITIONS:
+        try:
+            os.remove(_full_path(rendition_path(image_path, size)))
+        except FileNotFoundError:
+            pass
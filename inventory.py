@@ -0,0 +1,163 @@
+# inventory.py
+"""Room-night calendar: the authoritative record of which service is taken when.
+
+Approving a booking inserts one RoomNight row per occupied date; the
+(service_id, night) primary key turns a double booking into an IntegrityError
+raised by that single insert, so two admins approving overlapping requests at
+the same time cannot both succeed.
+"""
+import logging
+from datetime import timedelta
+
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models import Booking, RoomNight, Service
+
+logger = logging.getLogger(__name__)
+
+
+class RoomConflict(Exception):
+    """The service is already reserved for at least one date of the booking."""
+
+
+def stay_dates(start_date, end_date):
+    """Every date a booking occupies (inclusive on both ends)."""
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+def reserve_booking(session, booking):
+    """Insert the booking's room nights. Raises RoomConflict on overlap.
+
+    Runs in a savepoint, so a conflict leaves the rest of the session's
+    transaction untouched.
+    """
+    rows = [
+        {"service_id": booking.service_id, "night": night, "booking_id": booking.booking_id}
+        for night in stay_dates(booking.start_date, booking.end_date)
+    ]
+    try:
+        with session.begin_nested():
+            session.execute(insert(RoomNight), rows)
+    except IntegrityError as exc:
+        raise RoomConflict(
+            f"Service {booking.service_id} is already booked between "
+            f"{booking.start_date} and {booking.end_date}"
+        ) from exc
+
+
+def reserve_bookings(session, bookings):
+    """Reserve nights for many bookings at once, checking the whole batch together.
+
+    `bookings` are rows with booking_id, service_id, start_date and end_date,
+    in priority order: when two of them overlap, the earlier one wins. One
+    query reads the calendar for every service involved and one insert
+    writes all the nights. Returns (reserved booking_ids, {booking_id:
+    booking_id it clashes with, or None if its service is gone}).
+    """
+    bookings = list(bookings)
+    with_service = [b for b in bookings if b.service_id is not None]
+    taken = {}
+    if with_service:
+        taken = {
+            (service_id, night): booking_id
+            for service_id, night, booking_id in session.execute(
+                select(RoomNight.service_id, RoomNight.night, RoomNight.booking_id).where(
+                    RoomNight.service_id.in_({b.service_id for b in with_service}),
+                    RoomNight.night.between(min(b.start_date for b in with_service),
+                                            max(b.end_date for b in with_service)),
+                )
+            )
+        }
+
+    reserved, conflicts, rows = [], {}, []
+    for booking in bookings:
+        if booking.service_id is None:
+            conflicts[booking.booking_id] = None
+            continue
+        keys = [(booking.service_id, night) for night in stay_dates(booking.start_date, booking.end_date)]
+        clash = next((taken[key] for key in keys if key in taken), None)
+        if clash is not None:
+            conflicts[booking.booking_id] = clash
+            continue
+        for service_id, night in keys:
+            taken[service_id, night] = booking.booking_id
+            rows.append({"service_id": service_id, "night": night, "booking_id": booking.booking_id})
+        reserved.append(booking.booking_id)
+
+    if rows:
+        try:
+            with session.begin_nested():
+                session.execute(insert(RoomNight), rows)
+        except IntegrityError as exc:
+            raise RoomConflict("The calendar changed while the batch was being checked") from exc
+    return reserved, conflicts
+
+
+def release_booking(session, booking_id):
+    session.execute(delete(RoomNight).where(RoomNight.booking_id == booking_id))
+
+
+def release_service(session, service_id):
+    session.execute(delete(RoomNight).where(RoomNight.service_id == service_id))
+
+
+def set_booking_status(session, booking, status):
+    """Change a booking's status, keeping the calendar in step. Does not commit.
+
+    Raises RoomConflict when approval would double-book; the calendar insert
+    runs in its own savepoint, so nothing is left half-done.
+    """
+    if status == "approved" and booking.booking_status != "approved":
+        reserve_booking(session, booking)
+    elif status != "approved" and booking.booking_status == "approved":
+        release_booking(session, booking.booking_id)
+    booking.booking_status = status
+
+
+def cancel_booking(session, booking):
+    """Delete a booking together with any nights it holds. Does not commit."""
+    release_booking(session, booking.booking_id)
+    session.delete(booking)
+
+
+def available_services_stmt(start_date, end_date, category=None):
+    """SELECT of services with no reserved night in the range."""
+    stmt = select(Service).where(
+        ~exists().where(
+            RoomNight.service_id == Service.service_id,
+            RoomNight.night.between(start_date, end_date),
+        )
+    )
+    if category and category != "All":
+        stmt = stmt.where(Service.category == category)
+    return stmt
+
+
+def backfill_room_nights(conn, batch_size=1000):
+    """Populate room_nights from the approved bookings already in the database.
+
+    Legacy data may contain overlapping approved bookings; the first booking
+    (by timestamp) keeps a contested night and the clash is logged.
+    """
+    taken = set(conn.execute(select(RoomNight.service_id, RoomNight.night)).all())
+    result = conn.execute(
+        select(Booking.booking_id, Booking.service_id, Booking.start_date, Booking.end_date)
+        .where(Booking.booking_status == "approved", Booking.service_id.is_not(None))
+        .order_by(Booking.booking_timestamp, Booking.booking_id)
+    )
+    rows, clashes = [], 0
+    for booking_id, service_id, start_date, end_date in result:
+        for night in stay_dates(start_date, end_date):
+            if (service_id, night) in taken:
+                clashes += 1
+                continue
+            taken.add((service_id, night))
+            rows.append({"service_id": service_id, "night": night, "booking_id": booking_id})
+        if len(rows) >= batch_size:
+            conn.execute(insert(RoomNight), rows)
+            rows = []
+    if rows:
+        conn.execute(insert(RoomNight), rows)
+    if clashes:
+        logger.warning("Room-night backfill skipped %s nights already held by an earlier approved booking", clashes)
@@ -0,0 +1,252 @@
+# migrations.py
+"""Versioned schema migrations for existing databases.
+
+Base.metadata.create_all() only creates missing tables, so anything added to an
+existing table (indexes, columns, backfills) goes here as a numbered step.
+get_engine() calls run_migrations() at startup; each step runs once, in its own
+transaction, and is recorded in the schema_migrations table.
+
+Run `python migrations.py` to apply pending steps by hand and print the query
+plans of the hot queries before and after.
+"""
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, inspect, select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.schema import CreateColumn
+
+from inventory import available_services_stmt, backfill_room_nights
+from image_store import adopt_legacy_images
+from models import (
+    Base, Booking, CatalogVersion, ImageBlob, Package, PackageBooking, PackageBookingService, RoomNight,
+    Service, ServiceImage, User,
+)
+from package_items import backfill_package_booking_services, bookings_including_service_stmt
+from user_stats import refresh_user_stats
+
+logger = logging.getLogger(__name__)
+
+_migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+
+# --- helpers ---------------------------------------------------------------
+
+def _create_indexes_if_missing(conn, table):
+    """Create every Index declared on a model's table that the database lacks."""
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+
+def _add_columns_if_missing(conn, table, *names):
+    """ALTER TABLE ... ADD COLUMN for model columns the database table lacks."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            ddl = CreateColumn(table.c[name]).compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+
+
+# --- query plans -----------------------------------------------------------
+
+def _hot_queries():
+    """The queries the indexes are tuned for, keyed by a short name."""
+    start, end = date(2025, 1, 1), date(2025, 1, 5)
+    return {
+        "available_services": select(Service).where(
+            Service.category == "Single",
+            ~Service.service_id.in_(
+                select(Booking.service_id).where(
+                    Booking.start_date <= end,
+                    Booking.end_date >= start,
+                    Booking.booking_status == "approved",
+                )
+            ),
+        ),
+        "calendar_availability": available_services_stmt(start, end, "Single"),
+        "user_bookings": select(Booking).where(Booking.user_id == 1),
+        "user_package_bookings": select(PackageBooking).where(PackageBooking.user_id == 1),
+        "add_on_services": select(Service).where(Service.is_add_on == True),
+        "user_names": select(User).where(User.username == "admin"),
+        "package_bookings_with_service": bookings_including_service_stmt(1),
+        "booking_history_page": select(Booking).where(Booking.booking_status == "pending")
+        .order_by(Booking.booking_timestamp.desc(), Booking.booking_id.desc()).limit(25),
+    }
+
+
+def explain(conn, stmt):
+    """Return the database's query plan for a statement as a list of lines."""
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}").all()
+        return [row[-1] for row in rows]
+    return [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {compiled}").all()]
+
+
+def query_plans(conn):
+    plans = {}
+    for name, stmt in _hot_queries().items():
+        try:
+            # Before a migration the models may already name columns the
+            # database lacks; record that instead of failing.
+            with conn.begin_nested():
+                plans[name] = explain(conn, stmt)
+        except DBAPIError as exc:
+            plans[name] = [f"unavailable: {exc.orig}"]
+    return plans
+
+
+def full_scans(plans):
+    """Names of hot queries whose plan still scans a table without an index."""
+    scans = {}
+    for name, plan in plans.items():
+        lines = [line for line in plan if line.startswith("SCAN") and "USING" not in line]
+        if lines:
+            scans[name] = lines
+    return scans
+
+
+# --- migrations ------------------------------------------------------------
+
+def _add_hot_path_indexes(conn):
+    for model in (Booking, PackageBooking, Service):
+        _create_indexes_if_missing(conn, model.__table__)
+
+
+def _add_room_night_calendar(conn):
+    RoomNight.__table__.create(conn, checkfirst=True)
+    backfill_room_nights(conn)
+
+
+def _add_keyset_pagination_indexes(conn):
+    # Keyset pagination compares (booking_timestamp, booking_id) tuples, which
+    # never match a NULL timestamp, so give legacy rows the earliest possible one.
+    for model in (Booking, PackageBooking):
+        conn.execute(
+            update(model).where(model.booking_timestamp.is_(None)).values(booking_timestamp=datetime(1970, 1, 1))
+        )
+        _create_indexes_if_missing(conn, model.__table__)
+
+
+def _add_user_stats_counters(conn):
+    _add_columns_if_missing(
+        conn, User.__table__,
+        "service_booking_count", "package_booking_count", "total_spend_rwf", "last_booking_at",
+    )
+    refresh_user_stats(conn)
+
+
+def _add_package_booking_services(conn):
+    PackageBookingService.__table__.create(conn, checkfirst=True)
+    backfill_package_booking_services(conn)
+
+
+def _add_catalog_version(conn):
+    CatalogVersion.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(CatalogVersion.id).where(CatalogVersion.id == 1)).first() is None:
+        conn.execute(insert(CatalogVersion).values(id=1, version=1))
+
+
+def _add_image_store(conn):
+    ImageBlob.__table__.create(conn, checkfirst=True)
+    for model in (ServiceImage, Service, Package):
+        _create_indexes_if_missing(conn, model.__table__)
+    adopt_legacy_images(conn)
+
+
+def _add_auth_version(conn):
+    _add_columns_if_missing(conn, User.__table__, "auth_version")
+
+
+# (version, description, function taking a Connection). Append only; never renumber.
+MIGRATIONS = [
+    (1, "Indexes for availability, booking history and catalog queries", _add_hot_path_indexes),
+    (2, "Room-night calendar backfilled from approved bookings", _add_room_night_calendar),
+    (3, "Keyset pagination indexes for the admin booking history", _add_keyset_pagination_indexes),
+    (4, "Denormalized booking counters on users", _add_user_stats_counters),
+    (5, "package_booking_services backfilled from selected_services JSON", _add_package_booking_services),
+    (6, "Catalog version stamp for the catalog cache", _add_catalog_version),
+    (7, "Content-addressed image store; legacy images adopted", _add_image_store),
+    (8, "Account version stamp for cached session identities", _add_auth_version),
+]
+
+
+def applied_versions(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine):
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def run_migrations(engine, check_plans=True):
+    """Apply pending migrations. Returns the list of versions applied.
+
+    With check_plans, the hot-query plans are captured before and after and any
+    change is logged, along with hot queries that still do a full table scan.
+    """
+    pending = pending_migrations(engine)
+    if not pending:
+        return []
+
+    if check_plans:
+        with engine.connect() as conn:
+            before = query_plans(conn)
+
+    applied = []
+    for version, description, migrate in pending:
+        try:
+            with engine.begin() as conn:
+                if version in applied_versions(conn):
+                    continue  # another process got there first
+                migrate(conn)
+                conn.execute(schema_migrations.insert().values(version=version, description=description))
+        except IntegrityError:
+            continue  # concurrent startup recorded the same version
+        logger.info("Applied migration %s: %s", version, description)
+        applied.append(version)
+
+    if check_plans:
+        with engine.connect() as conn:
+            after = query_plans(conn)
+        for name in after:
+            if before.get(name) != after[name]:
+                logger.info("Query plan for %s changed:\n  before: %s\n  after:  %s",
+                            name, before.get(name), after[name])
+        for name, lines in full_scans(after).items():
+            logger.warning("Hot query %s still does a full scan: %s", name, lines)
+    return applied
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    from database import build_engine
+
+    engine = build_engine()
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        before = query_plans(conn)
+    applied = run_migrations(engine, check_plans=False)
+    with engine.connect() as conn:
+        after = query_plans(conn)
+
+    print(f"Applied migrations: {applied or 'none (schema up to date)'}")
+    for name in after:
+        print(f"\n{name}")
+        print(f"  before: {before[name]}")
+        print(f"  after:  {after[name]}")
+    scans = full_scans(after)
+    print(f"\nHot queries still scanning: {sorted(scans) or 'none'}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, Table, LargeBinary
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, Table, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from sqlalchemy.orm import DeclarativeBase
@@ -6,6 +6,12 @@ from sqlalchemy.orm import DeclarativeBase
 class Base(DeclarativeBase):
     pass
 
+class CatalogVersion(Base):
+    """Single-row stamp bumped by every service/package write (see catalog.py)."""
+    __tablename__ = "catalog_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+
 class User(Base):
     __tablename__ = "users"
     user_id = Column(Integer, primary_key=True, index=True)
@@ -18,6 +24,15 @@ class User(Base):
     is_active = Column(Boolean, default=True)  # Account status
     created_at = Column(DateTime, default=datetime.utcnow)
     email = Column(String)  # Add email field
+
+    # Denormalized booking stats, maintained by user_stats on every booking write
+    service_booking_count = Column(Integer, nullable=False, default=0, server_default="0")
+    package_booking_count = Column(Integer, nullable=False, default=0, server_default="0")
+    total_spend_rwf = Column(Float, nullable=False, default=0, server_default="0")
+    last_booking_at = Column(DateTime)
+
+    # Bumped whenever the account is disabled/enabled; see identity.py
+    auth_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     bookings = relationship("Booking", back_populates="user")
     package_bookings = relationship("PackageBooking", back_populates="user")
@@ -42,6 +57,10 @@ class Package(Base):
     is_customizable = Column(Boolean, default=True)
     cover_image = Column(String)
 
+    __table_args__ = (
+        Index("ix_packages_cover_image", "cover_image"),  # image store reference counts
+    )
+
     services = relationship("Service", secondary=package_services, back_populates="packages")
     bookings = relationship("PackageBooking", back_populates="package")
 
@@ -58,9 +77,17 @@ class Service(Base):
     max_capacity = Column(Integer)
     is_add_on = Column(Boolean, default=False)  # Whether this can be added to packages
 
+    __table_args__ = (
+        Index("ix_services_category_add_on", "category", "is_add_on"),  # home_page category filter
+        Index("ix_services_add_on", "is_add_on"),  # add-on pickers
+        Index("ix_services_cover_image", "cover_image"),  # image store reference counts
+    )
+
     images = relationship("ServiceImage", back_populates="service", cascade="all, delete-orphan")
     bookings = relationship("Booking", back_populates="service")
     packages = relationship("Package", secondary=package_services, back_populates="services")
+    package_booking_items = relationship("PackageBookingService", back_populates="service",
+                                         cascade="all, delete-orphan", passive_deletes=True)
 
 class ServiceImage(Base):
     __tablename__ = "service_images"
@@ -71,6 +98,10 @@ class ServiceImage(Base):
     caption = Column(String)
     upload_date = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_service_images_image_path", "image_path"),  # image store reference counts
+    )
+
     service = relationship("Service", back_populates="images")
 
 class Booking(Base):
@@ -86,9 +117,34 @@ class Booking(Base):
     guest_count = Column(Integer, default=1)
     special_requests = Column(Text)
 
+    __table_args__ = (
+        # get_available_services: approved bookings overlapping a date range (covering index)
+        Index("ix_bookings_status_dates", "booking_status", "start_date", "end_date", "service_id"),
+        # per-service availability / calendar checks
+        Index("ix_bookings_service_dates", "service_id", "start_date", "end_date"),
+        # booking history and per-user counts
+        Index("ix_bookings_user_timestamp", "user_id", "booking_timestamp"),
+        # admin history: keyset pagination, optionally filtered by status
+        Index("ix_bookings_timestamp", "booking_timestamp", "booking_id"),
+        Index("ix_bookings_status_timestamp", "booking_status", "booking_timestamp", "booking_id"),
+    )
+
     user = relationship("User", back_populates="bookings")
     service = relationship("Service", back_populates="bookings")
 
+class RoomNight(Base):
+    """One row per service per occupied date of an approved booking.
+
+    The primary key makes double-booking a constraint violation, so approving
+    a booking is a single insert that fails on conflict. Dates run from
+    start_date to end_date inclusive, the same overlap rule the availability
+    search uses.
+    """
+    __tablename__ = "room_nights"
+    service_id = Column(Integer, ForeignKey("services.service_id", ondelete="CASCADE"), primary_key=True)
+    night = Column(Date, primary_key=True)
+    booking_id = Column(Integer, ForeignKey("bookings.booking_id", ondelete="CASCADE"), nullable=False, index=True)
+
 class PackageBooking(Base):
     __tablename__ = "package_bookings"
     booking_id = Column(Integer, primary_key=True, index=True)
@@ -101,7 +157,44 @@ class PackageBooking(Base):
     booking_timestamp = Column(DateTime, default=datetime.utcnow)
     guest_count = Column(Integer, nullable=False)
     special_requests = Column(Text)
-    selected_services = Column(Text)  # JSON string of selected service IDs
+    selected_services = Column(Text)  # Legacy JSON list of service IDs; package_booking_services is authoritative
+
+    __table_args__ = (
+        Index("ix_package_bookings_user_timestamp", "user_id", "booking_timestamp"),
+        Index("ix_package_bookings_timestamp", "booking_timestamp", "booking_id"),
+        Index("ix_package_bookings_status_timestamp", "booking_status", "booking_timestamp", "booking_id"),
+    )
 
     user = relationship("User", back_populates="package_bookings")
-    package = relationship("Package", back_populates="bookings")
\ No newline at end of file
+    package = relationship("Package", back_populates="bookings")
+    service_items = relationship("PackageBookingService", back_populates="package_booking",
+                                 cascade="all, delete-orphan")
+
+class PackageBookingService(Base):
+    """A service selected on a package booking, with what was charged for it."""
+    __tablename__ = "package_booking_services"
+    package_booking_id = Column(Integer, ForeignKey("package_bookings.booking_id", ondelete="CASCADE"), primary_key=True)
+    service_id = Column(Integer, ForeignKey("services.service_id", ondelete="CASCADE"), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=1)
+    price_rwf = Column(Float, nullable=False, default=0)  # Total charged for this line; 0 when included in the package
+
+    __table_args__ = (
+        # "which package bookings include service X" / add-on revenue per service
+        Index("ix_package_booking_services_service", "service_id", "package_booking_id"),
+    )
+
+    package_booking = relationship("PackageBooking", back_populates="service_items")
+    service = relationship("Service", back_populates="package_booking_items")
+
+class ImageBlob(Base):
+    """One stored image file, keyed by the SHA-256 of its bytes (see image_store.py)."""
+    __tablename__ = "image_blobs"
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String, nullable=False, unique=True)
+    size_bytes = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_image_blobs_ref_count", "ref_count"),
+    )
@@ -0,0 +1,101 @@
+# package_items.py
+"""Line items of a package booking (the package_booking_services table).
+
+Each selected service is stored with its quantity and what was charged for it,
+so "which package bookings include service X" and "add-on revenue per service"
+are indexed joins instead of parsing PackageBooking.selected_services JSON.
+"""
+import json
+import logging
+
+from sqlalchemy import func, insert, select
+
+from models import PackageBooking, PackageBookingService, Service, package_services
+
+logger = logging.getLogger(__name__)
+
+
+def service_line(category, price_rwf, included, guest_count):
+    """(quantity, price charged) for one service on a package booking.
+
+    Services already in the package cost nothing extra; add-ons of category
+    "Add-on" are charged per guest, anything else once.
+    """
+    if included:
+        return 1, 0.0
+    if category == "Add-on":
+        return guest_count, price_rwf * guest_count
+    return 1, price_rwf
+
+
+def build_service_items(lines):
+    """PackageBookingService rows for a new booking, from its quote's (service_id, quantity, price) lines."""
+    return [
+        PackageBookingService(service_id=service_id, quantity=quantity, price_rwf=price)
+        for service_id, quantity, price in lines
+    ]
+
+
+def bookings_including_service_stmt(service_id):
+    return (
+        select(PackageBooking)
+        .join(PackageBookingService)
+        .where(PackageBookingService.service_id == service_id)
+    )
+
+
+def service_revenue_stmt():
+    """(service_id, name, times booked, revenue) across all package bookings."""
+    return (
+        select(
+            Service.service_id,
+            Service.name,
+            func.count(PackageBookingService.package_booking_id).label("bookings"),
+            func.coalesce(func.sum(PackageBookingService.price_rwf), 0).label("revenue_rwf"),
+        )
+        .join(PackageBookingService, PackageBookingService.service_id == Service.service_id)
+        .group_by(Service.service_id, Service.name)
+    )
+
+
+def backfill_package_booking_services(conn, batch_size=1000):
+    """Create line items from the legacy selected_services JSON.
+
+    Prices are today's service prices, which is the best the legacy data allows.
+    Bookings that already have line items are left alone; IDs of services that
+    no longer exist are skipped.
+    """
+    services = {
+        row.service_id: (row.category, row.price_rwf)
+        for row in conn.execute(select(Service.service_id, Service.category, Service.price_rwf))
+    }
+    included = {}
+    for package_id, service_id in conn.execute(select(package_services.c.package_id, package_services.c.service_id)):
+        included.setdefault(package_id, set()).add(service_id)
+    done = set(conn.execute(select(PackageBookingService.package_booking_id).distinct()).scalars())
+
+    bookings = conn.execute(
+        select(PackageBooking.booking_id, PackageBooking.package_id, PackageBooking.guest_count,
+               PackageBooking.selected_services)
+    ).all()
+    rows, skipped = [], 0
+    for booking_id, package_id, guest_count, selected in bookings:
+        if booking_id in done or not selected:
+            continue
+        for service_id in dict.fromkeys(json.loads(selected)):
+            if service_id not in services:
+                skipped += 1
+                continue
+            category, price = services[service_id]
+            quantity, charged = service_line(
+                category, price, service_id in included.get(package_id, ()), guest_count or 1
+            )
+            rows.append({"package_booking_id": booking_id, "service_id": service_id,
+                         "quantity": quantity, "price_rwf": charged})
+        if len(rows) >= batch_size:
+            conn.execute(insert(PackageBookingService), rows)
+            rows = []
+    if rows:
+        conn.execute(insert(PackageBookingService), rows)
+    if skipped:
+        logger.warning("Package booking backfill skipped %s references to deleted services", skipped)
@@ -0,0 +1,32 @@
+# pagination.py
+"""Keyset (seek) pagination for the admin list pages.
+
+Instead of OFFSET, each page remembers the sort key of its last row and the
+next page asks for rows strictly after it, so every page is an index range
+scan of `page_size` rows no matter how deep into the table it is.
+"""
+from sqlalchemy import tuple_
+
+
+def keyset_page(session, stmt, columns, cursor=None, page_size=25, descending=True, scalars=True):
+    """Fetch one page of ORM rows from `stmt`, ordered by `columns`.
+
+    `columns` must end with a unique column (e.g. the primary key) so the order
+    is total. `cursor` is the key tuple returned for the previous page, or None
+    for the first page. With scalars=False full result rows are returned and the
+    cursor is read from the entity in the first column. Returns
+    (rows, next_cursor); next_cursor is None on the last page.
+    """
+    key = tuple_(*columns)
+    if cursor is not None:
+        stmt = stmt.where(key < tuple(cursor) if descending else key > tuple(cursor))
+    order = [c.desc() for c in columns] if descending else list(columns)
+    result = session.execute(stmt.order_by(*order).limit(page_size + 1))
+    rows = result.scalars().all() if scalars else result.all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1] if scalars else rows[-1][0]
+        next_cursor = tuple(getattr(last, c.key) for c in columns)
+    return rows, next_cursor
@@ -0,0 +1,145 @@
+# passwords.py
+"""Password hashing off the script thread, and login throttling.
+
+bcrypt is deliberately slow (~250 ms at the default cost). Hashes and checks
+run on a small worker pool shared by the whole process: bcrypt releases the
+GIL, so they don't stall other sessions' reruns, and a burst of logins can't
+use more than PASSWORD_WORKERS cores. At most PASSWORD_QUEUE_LIMIT requests
+may wait; beyond that PasswordServiceBusy is raised straight away.
+
+The cost comes from BCRYPT_ROUNDS. A login whose stored hash uses another
+cost is re-hashed (see needs_rehash).
+
+LoginThrottle counts failed logins per username and per client IP
+(LOGIN_MAX_FAILURES, LOGIN_MAX_FAILURES_PER_IP within LOGIN_WINDOW_SECONDS)
+and refuses further attempts for a while without touching the database or
+bcrypt.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+import streamlit as st
+
+from database import env_int
+
+DEFAULT_ROUNDS = 12
+
+
+def bcrypt_rounds():
+    return min(31, max(4, env_int("BCRYPT_ROUNDS", DEFAULT_ROUNDS)))
+
+
+class PasswordServiceBusy(Exception):
+    """Too many password checks are already queued."""
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Too many failed attempts. Try again in {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+def _as_bytes(value):
+    return value.encode() if isinstance(value, str) else value
+
+
+class PasswordHasher:
+    def __init__(self, workers, queue_limit, timeout=30):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+        self.timeout = timeout
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordServiceBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def hash(self, password):
+        return self._run(lambda: bcrypt.hashpw(password.encode(), bcrypt.gensalt(bcrypt_rounds())))
+
+    def verify(self, password, hashed):
+        return self._run(lambda: bcrypt.checkpw(password.encode(), _as_bytes(hashed)))
+
+
+def needs_rehash(hashed):
+    """True if `hashed` was made with a different cost than BCRYPT_ROUNDS."""
+    try:
+        return int(_as_bytes(hashed).split(b"$")[2]) != bcrypt_rounds()
+    except (IndexError, ValueError):
+        return True
+
+
+class LoginThrottle:
+    """Sliding-window failure counter per key (username, IP)."""
+
+    def __init__(self, max_failures, window_seconds, max_keys=10000):
+        self.max_failures = max_failures
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._failures = {}  # key -> list of failure timestamps
+        self._lock = threading.Lock()
+
+    def _recent(self, key, now):
+        times = [t for t in self._failures.get(key, ()) if t > now - self.window]
+        if times:
+            self._failures[key] = times
+        else:
+            self._failures.pop(key, None)
+        return times
+
+    def check(self, *keys):
+        """Raise LoginThrottled if any of `keys` has too many recent failures."""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                times = self._recent(key, now) if key else []
+                if len(times) >= self.max_failures:
+                    raise LoginThrottled(int(times[0] + self.window - now) + 1)
+
+    def failed(self, *keys):
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) >= self.max_keys:
+                for key in list(self._failures):
+                    self._recent(key, now)
+            for key in keys:
+                if key:
+                    self._failures.setdefault(key, []).append(now)
+
+    def succeeded(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._failures.pop(key, None)
+
+
+@st.cache_resource
+def get_password_hasher():
+    workers = max(1, env_int("PASSWORD_WORKERS", min(4, os.cpu_count() or 1)))
+    return PasswordHasher(workers, max(0, env_int("PASSWORD_QUEUE_LIMIT", workers * 8)))
+
+
+@st.cache_resource
+def get_login_throttles():
+    """(per-username, per-IP) throttles. An IP may be shared (NAT), so it gets a higher limit."""
+    window = env_int("LOGIN_WINDOW_SECONDS", 300)
+    return (
+        LoginThrottle(env_int("LOGIN_MAX_FAILURES", 5), window),
+        LoginThrottle(env_int("LOGIN_MAX_FAILURES_PER_IP", 20), window),
+    )
+
+
+def hash_password(password):
+    return get_password_hasher().hash(password)
+
+
+def verify_password(password, hashed):
+    return get_password_hasher().verify(password, hashed)
@@ -0,0 +1,199 @@
+# pricing.py
+"""Quotes for service and package bookings.
+
+A service stay costs the nightly price times each night's rate factor; a
+package costs its base price times the average factor over its days, plus the
+services added on top (package_items.service_line: add-ons of category
+"Add-on" are charged per guest, anything else once, included services are
+free). The booking pages show a quote and book with that same quote, so the
+price displayed is the price stored.
+
+Rate factors come from an optional JSON file (PRICING_RULES_FILE, default
+pricing_rules.json next to the app), reloaded when it changes:
+
+    {
+      "weekdays": {"Fri": 1.15, "Sat": 1.15},
+      "seasons": [
+        {"start": "12-15", "end": "01-05", "multiplier": 1.3, "categories": ["Suite"]}
+      ]
+    }
+
+Seasons are inclusive month-day ranges and may wrap the new year; without
+"categories" they apply to every service and package category. Where seasons
+overlap the later one wins; weekday and season factors multiply. Without the
+file every factor is 1 and prices are exactly nights x price as before.
+
+Quotes are memoized on their inputs. Catalog entries are frozen snapshots
+(catalog.py), so a price edit is a new key rather than a stale hit.
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from package_items import service_line
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
+def _day_index(month, day):
+    return month * 32 + day
+
+
+def _parse_month_day(text):
+    month, day = (int(part) for part in text.split("-"))
+    if not (1 <= month <= 12 and 1 <= day <= 31):
+        raise ValueError(f"invalid month-day {text!r}")
+    return _day_index(month, day)
+
+
+@dataclass(frozen=True)
+class Season:
+    start: int  # _day_index(month, day)
+    end: int
+    multiplier: float
+    categories: frozenset = frozenset()  # empty: every category
+
+    def applies_to(self, category):
+        return not self.categories or category in self.categories
+
+    def mask(self, index):
+        if self.start <= self.end:
+            return (index >= self.start) & (index <= self.end)
+        return (index >= self.start) | (index <= self.end)
+
+
+@dataclass(frozen=True)
+class RateTable:
+    weekdays: tuple = (1.0,) * 7  # Monday first
+    seasons: tuple = ()
+
+    def is_flat(self, category):
+        return all(f == 1.0 for f in self.weekdays) and not any(s.applies_to(category) for s in self.seasons)
+
+    def factors(self, category, days):
+        """Rate factor of each day in a datetime64[D] array."""
+        days = np.asarray(days, dtype="datetime64[D]")
+        factors = np.asarray(self.weekdays)[(days.astype(np.int64) + 3) % 7]  # 1970-01-01 was a Thursday
+        seasons = [s for s in self.seasons if s.applies_to(category)]
+        if seasons:
+            months = days.astype("datetime64[M]")
+            index = _day_index(months.astype(np.int64) % 12 + 1, (days - months).astype(np.int64) + 1)
+            season_factor = np.ones(len(days))
+            for season in seasons:
+                season_factor[season.mask(index)] = season.multiplier
+            factors = factors * season_factor
+        return factors
+
+
+FLAT_RATES = RateTable()
+
+
+def parse_rate_table(data):
+    weekdays = [1.0] * 7
+    for name, factor in (data.get("weekdays") or {}).items():
+        weekdays[WEEKDAYS.index(name[:3].title())] = float(factor)
+    seasons = tuple(
+        Season(
+            _parse_month_day(season["start"]),
+            _parse_month_day(season["end"]),
+            float(season["multiplier"]),
+            frozenset(season.get("categories") or ()),
+        )
+        for season in data.get("seasons") or ()
+    )
+    return RateTable(tuple(weekdays), seasons)
+
+
+@lru_cache(maxsize=4)
+def _load_rate_table(path, mtime_ns):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return parse_rate_table(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError):
+        logger.exception("Ignoring invalid pricing rules in %s", path)
+        return FLAT_RATES
+
+
+def get_rate_table():
+    path = os.getenv("PRICING_RULES_FILE", "pricing_rules.json")
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return FLAT_RATES
+    return _load_rate_table(path, mtime_ns)
+
+
+def stay_totals(price_rwf, category, starts, ends, rates=FLAT_RATES):
+    """Totals for many stays at once: price x the rate factor of every night.
+
+    `starts` and `ends` are sequences of dates (end exclusive). Returns a float
+    array; stays of less than one night cost 0.
+    """
+    starts = np.asarray(starts, dtype="datetime64[D]")
+    nights = np.maximum((np.asarray(ends, dtype="datetime64[D]") - starts).astype(np.int64), 0)
+    if rates.is_flat(category):
+        return price_rwf * nights.astype(float)
+    # Every night of every stay in one array, labelled with the stay it belongs to
+    stay = np.repeat(np.arange(len(starts)), nights)
+    offset = np.arange(len(stay)) - np.repeat(np.cumsum(nights) - nights, nights)
+    factors = rates.factors(category, starts[stay] + offset)
+    return price_rwf * np.bincount(stay, weights=factors, minlength=len(starts))
+
+
+@dataclass(frozen=True)
+class Quote:
+    total_rwf: float
+    nights: int
+    base_rwf: float  # nightly stay / package base price, with rates applied
+    lines: tuple = ()  # (service_id, quantity, price_rwf) of each package service
+
+    @property
+    def per_night_rwf(self):
+        return self.base_rwf / self.nights if self.nights else 0.0
+
+
+@lru_cache(maxsize=4096)
+def _quote_service(service, start_date, end_date, rates):
+    nights = max((end_date - start_date).days, 0)
+    total = float(stay_totals(service.price_rwf, service.category, [start_date], [end_date], rates)[0])
+    return Quote(total, nights, total)
+
+
+def quote_service(service, start_date, end_date):
+    """Quote a stay at a catalog ServiceInfo from start_date to end_date (check-out)."""
+    return _quote_service(service, start_date, end_date, get_rate_table())
+
+
+@lru_cache(maxsize=4096)
+def _quote_package(package, start_date, guest_count, add_ons, rates):
+    days = max(package.duration_days or 1, 1)
+    if rates.is_flat(package.category):
+        base = package.base_price_rwf
+    else:
+        end = start_date + timedelta(days=days)
+        base = float(stay_totals(package.base_price_rwf, package.category, [start_date], [end], rates)[0]) / days
+
+    included = frozenset(package.service_ids)
+    total, lines = base, []
+    for service in add_ons:
+        quantity, price = service_line(service.category, service.price_rwf, service.service_id in included, guest_count)
+        total += price
+        lines.append((service.service_id, quantity, price))
+    return Quote(total, days, base, tuple(lines))
+
+
+def quote_package(package, start_date, guest_count, services):
+    """Quote a catalog PackageInfo for guest_count guests with the selected services.
+
+    `services` are the catalog ServiceInfo entries chosen (the package's own
+    services cost nothing extra). Each service is counted once.
+    """
+    selected = tuple({service.service_id: service for service in services}.values())
+    return _quote_package(package, start_date, guest_count, selected, get_rate_table())
@@ -0,0 +1,267 @@
+# provision_users.py
+"""Create or update user accounts in bulk from a CSV or XLSX file.
+
+    python provision_users.py users.csv [--batch-size 500] [--workers N]
+                              [--reset-passwords] [--errors report.csv]
+
+The first row holds the column names: username, password, full_name,
+phone_number, age, and optionally role (User/Admin, default User), email and
+is_active. Rows are streamed, so the file can be any size.
+
+Usernames are matched exactly, the same way login does. New users are
+inserted; existing ones get their profile fields updated. Passwords are only
+hashed for new users (or for everyone with --reset-passwords), so running
+the same file twice changes nothing and costs no bcrypt time. Hashing runs on
+a process pool at BCRYPT_ROUNDS.
+
+Each batch is one transaction. A batch the database rejects is retried row
+by row, so one bad row fails alone. Rows that fail are written to the error
+report together with their line number and the reason.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import bcrypt
+from sqlalchemy import bindparam, case, insert, or_, select, update
+from sqlalchemy.exc import DBAPIError
+
+from database import get_engine, writer_engine
+from models import User
+from passwords import bcrypt_rounds
+
+ROLES = ("User", "Admin")
+TRUE_VALUES = {"1", "true", "yes", "y", "active"}
+FALSE_VALUES = {"0", "false", "no", "n", "disabled", "inactive"}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _hash(args):
+    password, rounds = args
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds))
+
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # Excel stores phone numbers and ages as floats
+    return str(value).strip()
+
+
+def read_rows(path):
+    """Yield (line number, {column: text}) from a CSV or XLSX file, lazily."""
+    if Path(path).suffix.lower() in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_text(h).lower() for h in next(rows, ())]
+            for line, values in enumerate(rows, start=2):
+                if any(v is not None for v in values):
+                    yield line, dict(zip(header, map(_text, values)))
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or ()]
+            for row in reader:
+                if any(row.values()):
+                    yield reader.line_num, {k: _text(v) for k, v in row.items() if k}
+
+
+def parse_row(row):
+    """Validated column values for one row (without the password hash)."""
+    username = row.get("username", "")
+    if not username:
+        raise RowError("username is required")
+    for field in ("full_name", "phone_number"):
+        if not row.get(field):
+            raise RowError(f"{field} is required")
+    try:
+        age = int(row.get("age", ""))
+    except ValueError:
+        raise RowError("age must be a whole number") from None
+    if not 1 <= age <= 120:
+        raise RowError("age must be between 1 and 120")
+    role = (row.get("role") or "User").capitalize()
+    if role not in ROLES:
+        raise RowError(f"role must be one of {', '.join(ROLES)}")
+    active = (row.get("is_active") or "true").lower()
+    if active not in TRUE_VALUES | FALSE_VALUES:
+        raise RowError("is_active must be true or false")
+    return {
+        "username": username,
+        "full_name": row["full_name"],
+        "phone_number": row["phone_number"],
+        "age": age,
+        "role": role,
+        "email": row.get("email") or None,
+        "is_active": active in TRUE_VALUES,
+    }
+
+
+PROFILE_FIELDS = ("full_name", "phone_number", "age", "role", "email", "is_active")
+
+# Bound names can't equal column names in an executemany UPDATE, hence the "new_" prefix
+_update_profile = (
+    update(User)
+    .where(User.username == bindparam("new_username"))
+    .values({
+        **{field: bindparam(f"new_{field}") for field in PROFILE_FIELDS},
+        # Signed-in sessions must notice a role or status change (see identity.py)
+        "auth_version": case(
+            (or_(User.role != bindparam("new_role"), User.is_active != bindparam("new_is_active")),
+             User.auth_version + 1),
+            else_=User.auth_version,
+        ),
+    })
+)
+_update_password = (
+    update(User)
+    .where(User.username == bindparam("new_username"))
+    .values(hashed_password=bindparam("new_hashed_password"))
+)
+
+
+class Provisioner:
+    def __init__(self, engine, pool, workers, reset_passwords=False):
+        self.engine = engine
+        self.pool = pool
+        self.workers = workers
+        self.reset_passwords = reset_passwords
+        self.rounds = bcrypt_rounds()
+        self.created = self.updated = self.failed = 0
+        self.errors = []  # (line, username, reason)
+
+    def fail(self, line, username, reason):
+        self.failed += 1
+        self.errors.append((line, username, reason))
+
+    def _hash_all(self, passwords):
+        chunk = max(1, len(passwords) // (4 * self.workers))
+        return list(self.pool.map(_hash, [(p, self.rounds) for p in passwords], chunksize=chunk))
+
+    def _write(self, conn, inserts, updates):
+        if inserts:
+            conn.execute(insert(User), [values for _, values in inserts])
+        if updates:
+            params = [{f"new_{key}": value for key, value in values.items()} for _, values in updates]
+            conn.execute(_update_profile, params)
+            if self.reset_passwords:
+                conn.execute(_update_password, params)
+
+    def run_batch(self, batch):
+        """batch: list of (line, values, password)."""
+        usernames = [values["username"] for _, values, _ in batch]
+        with self.engine.connect() as conn:
+            existing = set(conn.execute(select(User.username).where(User.username.in_(usernames))).scalars())
+
+        inserts, updates, to_hash = [], [], []
+        for line, values, password in batch:
+            is_new = values["username"] not in existing
+            if (is_new or self.reset_passwords) and not password:
+                self.fail(line, values["username"], "password is required")
+                continue
+            (inserts if is_new else updates).append((line, values))
+            if is_new or self.reset_passwords:
+                to_hash.append((values, password))
+        for (values, _), hashed in zip(to_hash, self._hash_all([p for _, p in to_hash])):
+            values["hashed_password"] = hashed
+
+        try:
+            with self.engine.begin() as conn:
+                self._write(conn, inserts, updates)
+        except DBAPIError:
+            # Find the offending rows: one savepoint per row
+            inserts, updates = self._write_one_by_one(inserts, updates)
+        self.created += len(inserts)
+        self.updated += len(updates)
+
+    def _write_one_by_one(self, inserts, updates):
+        done_inserts, done_updates = [], []
+        # Savepoints need a real outer transaction on SQLite, see writer_engine()
+        with writer_engine(self.engine).begin() as conn:
+            for kind, rows, done in (("insert", inserts, done_inserts), ("update", updates, done_updates)):
+                for line, values in rows:
+                    try:
+                        with conn.begin_nested():
+                            if kind == "insert":
+                                self._write(conn, [(line, values)], [])
+                            else:
+                                self._write(conn, [], [(line, values)])
+                        done.append((line, values))
+                    except DBAPIError as e:
+                        self.fail(line, values["username"], str(e.orig))
+        return done_inserts, done_updates
+
+
+def write_error_report(path, errors):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["line", "username", "error"])
+        writer.writerows(sorted(errors))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or update users from a CSV/XLSX file.")
+    parser.add_argument("path")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="password hashing processes")
+    parser.add_argument("--reset-passwords", action="store_true", help="also set passwords of existing users")
+    parser.add_argument("--errors", help="error report path (default: <input>.errors.csv)")
+    args = parser.parse_args(argv)
+
+    engine = get_engine()  # creates tables and applies migrations
+    started = time.perf_counter()
+    seen = set()
+    processed = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        provisioner = Provisioner(engine, pool, args.workers, reset_passwords=args.reset_passwords)
+
+        def flush(batch):
+            provisioner.run_batch(batch)
+            elapsed = time.perf_counter() - started
+            print(f"{processed} rows, {provisioner.created} created, {provisioner.updated} updated, "
+                  f"{provisioner.failed} failed - {processed / elapsed:.0f} rows/s", flush=True)
+
+        batch = []
+        for line, row in read_rows(args.path):
+            processed += 1
+            try:
+                values = parse_row(row)
+                if values["username"] in seen:
+                    raise RowError("duplicate username in this file")
+            except RowError as e:
+                provisioner.fail(line, row.get("username", ""), str(e))
+                continue
+            seen.add(values["username"])
+            batch.append((line, values, row.get("password", "")))
+            if len(batch) >= args.batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+    elapsed = time.perf_counter() - started
+    print(f"Done in {elapsed:.1f}s: {provisioner.created} created, {provisioner.updated} updated, "
+          f"{provisioner.failed} failed ({processed / elapsed if elapsed else 0:.0f} rows/s)")
+    if provisioner.errors:
+        report = args.errors or f"{args.path}.errors.csv"
+        write_error_report(report, provisioner.errors)
+        print(f"Errors written to {report}")
+    return 1 if provisioner.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# static_images.py
+"""Image URLs the browser can fetch and cache on its own.
+
+Pages render <img src=...> tags instead of pushing bytes through st.image, so
+images no longer travel over the session websocket on every rerun.
+
+URLs are fingerprinted. Blobs and their renditions are named by content
+hash; legacy paths get a ?v= stamp derived from mtime and size. A changed
+file therefore always gets a new URL.
+
+Two ways to serve them:
+
+- By default, Streamlit's static file serving (enableStaticServing in
+  .streamlit/config.toml) at app/static/. Browsers cache and revalidate
+  with ETag / Last-Modified.
+- With IMAGE_SERVER_PORT set, a small bundled server that sends
+  `Cache-Control: public, max-age=31536000, immutable` for fingerprinted
+  URLs, so repeat views never reach the server, and answers from the
+  in-memory image cache (image_cache.py). It listens on IMAGE_SERVER_HOST
+  (default 127.0.0.1; use 0.0.0.0 to expose it). IMAGE_BASE_URL is the
+  address browsers use for it (default http://localhost:<port>). If the
+  server can't start, e.g. the port is taken, images fall back to the
+  Streamlit static URLs.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import streamlit as st
+
+from image_cache import get_image_cache
+from image_store import is_blob_path
+from images import media_root
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "static"
+STREAMLIT_STATIC_URL = "app/static"
+IMMUTABLE = "public, max-age=31536000, immutable"
+DEFAULT_HOST = "127.0.0.1"
+
+mimetypes.add_type("image/webp", ".webp")
+
+
+def _server_port():
+    try:
+        return int(os.getenv("IMAGE_SERVER_PORT", ""))
+    except ValueError:
+        return None
+
+
+def image_server_running():
+    """True when images are served by the bundled server (and its cache)."""
+    return _server_port() is not None and get_image_server() is not None
+
+
+def image_server_failed():
+    """True when IMAGE_SERVER_PORT is set but the server couldn't start."""
+    return _server_port() is not None and get_image_server() is None
+
+
+def base_url():
+    if _server_port() is None:
+        return os.getenv("IMAGE_BASE_URL") or STREAMLIT_STATIC_URL
+    if get_image_server() is None:
+        return STREAMLIT_STATIC_URL  # IMAGE_BASE_URL points at the server that didn't start
+    return (os.getenv("IMAGE_BASE_URL") or f"http://localhost:{_server_port()}").rstrip("/")
+
+
+def fingerprint(image_path):
+    """'' for content-addressed paths, else a ?v= stamp that changes with the file."""
+    if is_blob_path(image_path):
+        return ""
+    stat = os.stat(os.path.join(media_root(), image_path))
+    stamp = hashlib.sha1(f"{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:12]
+    return f"?v={stamp}"
+
+
+def image_url(image_path):
+    """Fingerprinted URL of a file under static/ (e.g. static/images/blobs/ab/....webp)."""
+    relative = Path(image_path).as_posix()
+    if not relative.startswith(STATIC_DIR + "/"):
+        raise ValueError(f"{image_path} is not under {STATIC_DIR}/")
+    return f"{base_url()}/{quote(relative[len(STATIC_DIR) + 1:])}{fingerprint(image_path)}"
+
+
+class StaticImageHandler(BaseHTTPRequestHandler):
+    @property
+    def root(self):
+        return os.path.realpath(os.path.join(media_root(), STATIC_DIR))
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        url = urlsplit(self.path)
+        relative = unquote(url.path).lstrip("/")
+        full = os.path.realpath(os.path.join(self.root, relative))
+        content_type = mimetypes.guess_type(full)[0] or ""
+        if not full.startswith(self.root + os.sep) or not content_type.startswith("image/"):
+            self.send_error(404)
+            return
+        try:
+            data = get_image_cache().get(full)
+        except OSError:
+            self.send_error(404)
+            return
+
+        fingerprinted = is_blob_path(Path(STATIC_DIR, relative).as_posix()) or "v" in parse_qs(url.query)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", IMMUTABLE if fingerprinted else "no-cache")
+        self.send_header("X-Content-Type-Options", "nosniff")
+        self.end_headers()
+        if not head:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+@st.cache_resource
+def get_image_server():
+    """Start the bundled image server once per process (only when IMAGE_SERVER_PORT is set).
+
+    None if it can't listen; callers then use the Streamlit static URLs.
+    """
+    host = os.getenv("IMAGE_SERVER_HOST", DEFAULT_HOST)
+    try:
+        server = ThreadingHTTPServer((host, _server_port()), StaticImageHandler)
+    except OSError:
+        logger.exception("Image server could not listen on %s:%s; serving images through Streamlit",
+                         host, _server_port())
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="image-server", daemon=True).start()
+    logger.info("Serving images on %s:%s", host, server.server_port)
+    return server
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    port = _server_port() or 8502
+    print(f"Serving {os.path.join(media_root(), STATIC_DIR)} on port {port}")
+    ThreadingHTTPServer((os.getenv("IMAGE_SERVER_HOST", DEFAULT_HOST), port), StaticImageHandler).serve_forever()
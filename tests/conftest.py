@@ -0,0 +1,45 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import build_engine, load_engine_profile, writer_engine  # noqa: E402
+from models import Base  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A fresh SQLite database with the app's engine settings."""
+    profile = load_engine_profile()
+    profile["url"] = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = build_engine(profile)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sql_trace(engine):
+    """Every statement SQLite executes on connections opened from now on."""
+    statements = []
+
+    @event.listens_for(engine, "connect")
+    def trace(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(statements.append)
+
+    engine.dispose()  # reconnect with tracing
+    return statements
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def writer_session_factory(engine):
+    return sessionmaker(bind=writer_engine(engine))
@@ -0,0 +1,65 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+
+import booking_writes
+from inventory import RoomConflict
+from models import Booking, RoomNight, Service
+from write_queue import WriteQueue
+
+
+@pytest.fixture
+def synced(session_factory, writer_session_factory, monkeypatch):
+    """Index syncs, each with the booking status and nights committed when it ran.
+
+    Booking 1 holds Jan 3; bookings 2 (Jan 1-2) and 3 (Jan 2-4) are pending.
+    """
+    with session_factory() as session:
+        service = Service(service_id=1, name="Suite", category="Suite", price_rwf=1000)
+        session.add(service)
+        for booking_id, start, end, status in [(1, 3, 3, "approved"), (2, 1, 2, "pending"), (3, 2, 4, "pending")]:
+            session.add(Booking(booking_id=booking_id, service=service, start_date=date(2030, 1, start),
+                                end_date=date(2030, 1, end), total_price_rwf=1000, booking_status=status))
+        session.add(RoomNight(service_id=1, night=date(2030, 1, 3), booking_id=1))
+        session.commit()
+
+    syncs = []
+
+    class Index:
+        def sync_booking(self, booking_id, *state):
+            syncs.append((booking_id, committed(session_factory, booking_id)))
+
+    queue = WriteQueue(writer_session_factory, wait_ms=0)
+    monkeypatch.setattr(booking_writes, "get_write_queue", lambda: queue)
+    monkeypatch.setattr(booking_writes, "get_availability_index", Index)
+    return syncs
+
+
+def committed(session_factory, booking_id):
+    """(status or None if deleted, nights held) as another session sees them."""
+    with session_factory() as session:
+        status = session.execute(select(Booking.booking_status).where(Booking.booking_id == booking_id)).scalar()
+        nights = session.execute(
+            select(func.count()).select_from(RoomNight).where(RoomNight.booking_id == booking_id)
+        ).scalar()
+        return status, nights
+
+
+def test_approval_is_committed_before_the_index_sync(synced, session_factory):
+    booking_writes.change_booking_status(2, "approved")
+    assert synced == [(2, ("approved", 2))]
+    assert committed(session_factory, 2) == ("approved", 2)
+
+
+def test_conflicting_approval_changes_nothing(synced, session_factory):
+    with pytest.raises(RoomConflict):
+        booking_writes.change_booking_status(3, "approved")  # night 3 is taken
+    assert synced == []
+    assert committed(session_factory, 3) == ("pending", 0)
+
+
+def test_rejection_and_cancellation_release_nights_before_the_index_sync(synced, session_factory):
+    booking_writes.change_booking_status(1, "rejected")
+    booking_writes.remove_booking(2)
+    assert synced == [(1, ("rejected", 0)), (2, (None, 0))]
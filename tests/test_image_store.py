@@ -0,0 +1,28 @@
+import os
+
+from sqlalchemy import insert, select
+
+from image_store import adopt_legacy_images, is_blob_path
+from images import project_root
+from models import ImageBlob, Service
+
+
+def test_legacy_images_are_adopted_under_image_root(engine, tmp_path, monkeypatch):
+    root = tmp_path / "media"
+    monkeypatch.setenv("IMAGE_ROOT", str(root))
+    legacy = root / "static" / "images" / "1" / "cover.png"
+    legacy.parent.mkdir(parents=True)
+    legacy.write_bytes(os.urandom(64))
+    with engine.begin() as conn:
+        conn.execute(insert(Service).values(service_id=1, name="Suite", category="Suite", price_rwf=1000,
+                                            cover_image="static/images/1/cover.png"))
+
+    with engine.begin() as conn:
+        adopt_legacy_images(conn)
+        cover = conn.execute(select(Service.cover_image)).scalar()
+        ref_count = conn.execute(select(ImageBlob.ref_count).where(ImageBlob.path == cover)).scalar()
+
+    assert is_blob_path(cover)
+    assert ref_count == 1
+    assert (root / cover).read_bytes() == legacy.read_bytes()
+    assert not os.path.exists(os.path.join(project_root, cover))
@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+
+from inventory import RoomConflict, reserve_booking, reserve_bookings
+from models import Booking, RoomNight, Service
+
+
+@pytest.fixture
+def session(writer_session_factory):
+    """A write-queue session. Booking 1 holds Jan 3; bookings 2 (Jan 1-2), 3 (Jan 2-4) and 4 (Jan 5-6) are pending."""
+    with writer_session_factory() as session:
+        service = Service(service_id=1, name="Suite", category="Suite", price_rwf=1000)
+        session.add(service)
+        for booking_id, start, end, status in [(1, 3, 3, "approved"), (2, 1, 2, "pending"),
+                                               (3, 2, 4, "pending"), (4, 5, 6, "pending")]:
+            session.add(Booking(booking_id=booking_id, service=service, start_date=date(2030, 1, start),
+                                end_date=date(2030, 1, end), total_price_rwf=1000, booking_status=status))
+        session.add(RoomNight(service_id=1, night=date(2030, 1, 3), booking_id=1))
+        session.commit()
+        yield session
+
+
+def committed_nights(session_factory):
+    with session_factory() as other:
+        return other.execute(select(func.count()).select_from(RoomNight)).scalar()
+
+
+def test_conflict_mid_reservation_rolls_back_everything(session, session_factory, sql_trace):
+    sql_trace.clear()
+    reserve_booking(session, session.get(Booking, 2))
+    with pytest.raises(RoomConflict):
+        reserve_booking(session, session.get(Booking, 3))  # night 3 is taken
+
+    # The first reservation is still part of the open outer transaction...
+    assert not any(s.upper().startswith("COMMIT") for s in sql_trace)
+    assert session.execute(select(func.count()).select_from(RoomNight)).scalar() == 3
+    assert committed_nights(session_factory) == 1
+
+    # ...so giving up on it leaves the calendar as it was
+    session.rollback()
+    assert committed_nights(session_factory) == 1
+
+
+def test_batch_reservation_commits_with_the_caller(session, session_factory):
+    rows = session.execute(
+        select(Booking.booking_id, Booking.service_id, Booking.start_date, Booking.end_date)
+        .where(Booking.booking_id.in_([2, 3, 4])).order_by(Booking.booking_id)
+    ).all()
+    reserved, conflicts = reserve_bookings(session, rows)
+    assert reserved == [2, 4]
+    assert conflicts == {3: 2}  # earlier bookings in the batch win
+    assert committed_nights(session_factory) == 1  # not visible before the caller commits
+
+    session.commit()
+    assert committed_nights(session_factory) == 5
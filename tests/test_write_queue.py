@@ -0,0 +1,68 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from models import User
+from write_queue import WriteQueue
+
+
+def add_user(name, fail=False):
+    def op(session):
+        session.add(User(username=name, full_name=name, phone_number="1", age=30, hashed_password="x",
+                         role="User", created_at=datetime(2026, 1, 1)))
+        session.flush()
+        if fail:
+            raise ValueError(name)
+        return name
+    return op
+
+
+def run_group(queue, ops):
+    """Submit ops so that the writer commits them as one group."""
+    futures = [queue.submit(op) for op in ops]
+    for future in futures:
+        future.exception(timeout=10)
+    return futures
+
+
+def usernames(session_factory):
+    with session_factory() as session:
+        return set(session.execute(select(User.username)).scalars())
+
+
+def test_group_is_one_transaction(session_factory, writer_session_factory, sql_trace):
+    queue = WriteQueue(writer_session_factory, max_batch=3, wait_ms=500)
+    sql_trace.clear()
+    futures = run_group(queue, [add_user("a"), add_user("b"), add_user("c")])
+
+    assert [f.result() for f in futures] == ["a", "b", "c"]
+    assert queue.groups == 1
+    commands = [s.split()[0].upper() for s in sql_trace if s.split()[0].upper() in ("BEGIN", "COMMIT", "SAVEPOINT")]
+    assert commands == ["BEGIN", "SAVEPOINT", "SAVEPOINT", "SAVEPOINT", "COMMIT"]
+    assert usernames(session_factory) == {"a", "b", "c"}
+
+
+def test_failed_op_rolls_back_alone(session_factory, writer_session_factory, sql_trace):
+    queue = WriteQueue(writer_session_factory, max_batch=3, wait_ms=500)
+    sql_trace.clear()
+    futures = run_group(queue, [add_user("a"), add_user("b", fail=True), add_user("c")])
+
+    assert futures[0].result() == "a"
+    with pytest.raises(ValueError):
+        futures[1].result()
+    assert futures[2].result() == "c"
+    assert queue.groups == 1
+    assert sum(s.upper().startswith("BEGIN") for s in sql_trace) == 1
+    assert sum(s.upper().startswith("COMMIT") for s in sql_trace) == 1
+    assert usernames(session_factory) == {"a", "c"}
+
+
+def test_page_session_reads_then_writes_alongside_the_queue(session_factory, writer_session_factory):
+    queue = WriteQueue(writer_session_factory, wait_ms=0)
+    with session_factory() as page:
+        assert page.execute(select(User.username)).all() == []  # a page run starts with a read
+        queue.run(add_user("a"))
+        add_user("b")(page)
+        page.commit()
+    assert usernames(session_factory) == {"a", "b"}
@@ -0,0 +1,115 @@
+# user_stats.py
+"""Per-user booking statistics for the user management page.
+
+Two read paths:
+  * user_stats_query() - one grouped query joining booking aggregates onto users
+  * the denormalized counters on users (service_booking_count, ...) kept in step
+    by an after_flush hook whenever bookings are written; selected with
+    USER_STATS_SOURCE=denormalized in the environment.
+
+"Spend" counts approved bookings only.
+"""
+import os
+
+from sqlalchemy import case, event, func, select, update
+
+from models import Booking, PackageBooking, User
+
+
+def use_denormalized_stats():
+    return os.getenv("USER_STATS_SOURCE", "query").lower() == "denormalized"
+
+
+def _aggregate(model):
+    approved_price = case((model.booking_status == "approved", model.total_price_rwf), else_=0)
+    return (
+        select(
+            model.user_id.label("user_id"),
+            func.count().label("bookings"),
+            func.coalesce(func.sum(approved_price), 0).label("spend"),
+            func.max(model.booking_timestamp).label("last_booking_at"),
+        )
+        .group_by(model.user_id)
+        .subquery()
+    )
+
+
+def _latest(a, b):
+    """The later of two nullable timestamps (portable; SQLite's max(a, b) is NULL if either is)."""
+    return case((a.is_(None), b), (b.is_(None), a), (a > b, a), else_=b)
+
+
+def user_stats_query(users_stmt=None):
+    """Select (User, service_bookings, package_bookings, total_spend_rwf, last_booking_at).
+
+    `users_stmt` is an optional select(User) carrying filters; the aggregates are
+    outer-joined onto it so the whole list comes back in one statement.
+    """
+    service = _aggregate(Booking)
+    package = _aggregate(PackageBooking)
+    stmt = users_stmt if users_stmt is not None else select(User)
+    return (
+        stmt.add_columns(
+            func.coalesce(service.c.bookings, 0).label("service_bookings"),
+            func.coalesce(package.c.bookings, 0).label("package_bookings"),
+            (func.coalesce(service.c.spend, 0) + func.coalesce(package.c.spend, 0)).label("total_spend_rwf"),
+            _latest(service.c.last_booking_at, package.c.last_booking_at).label("last_booking_at"),
+        )
+        .outerjoin(service, service.c.user_id == User.user_id)
+        .outerjoin(package, package.c.user_id == User.user_id)
+    )
+
+
+def denormalized_stats_query(users_stmt=None):
+    """Same shape as user_stats_query(), read from the counters on users."""
+    stmt = users_stmt if users_stmt is not None else select(User)
+    return stmt.add_columns(
+        User.service_booking_count.label("service_bookings"),
+        User.package_booking_count.label("package_bookings"),
+        User.total_spend_rwf.label("total_spend_rwf"),
+        User.last_booking_at.label("last_booking_at"),
+    )
+
+
+def stats_query(users_stmt=None):
+    return denormalized_stats_query(users_stmt) if use_denormalized_stats() else user_stats_query(users_stmt)
+
+
+# --- denormalized counters --------------------------------------------------
+
+def _correlated(model, column, *criteria):
+    return select(column).where(model.user_id == User.user_id, *criteria).scalar_subquery()
+
+
+def refresh_user_stats(conn, user_ids=None):
+    """Recompute the counters on users (all users when user_ids is None)."""
+    def approved_spend(model):
+        return _correlated(model, func.coalesce(func.sum(model.total_price_rwf), 0),
+                           model.booking_status == "approved")
+
+    stmt = update(User).values(
+        service_booking_count=_correlated(Booking, func.count()),
+        package_booking_count=_correlated(PackageBooking, func.count()),
+        total_spend_rwf=approved_spend(Booking) + approved_spend(PackageBooking),
+        last_booking_at=_latest(
+            _correlated(Booking, func.max(Booking.booking_timestamp)),
+            _correlated(PackageBooking, func.max(PackageBooking.booking_timestamp)),
+        ),
+    )
+    if user_ids is not None:
+        stmt = stmt.where(User.user_id.in_(user_ids))
+    conn.execute(stmt)
+
+
+def install_user_stats_listener(session_factory):
+    """Keep the users counters in step with every flushed booking write."""
+
+    @event.listens_for(session_factory, "after_flush")
+    def refresh_touched_users(session, flush_context):
+        touched = {
+            obj.user_id
+            for obj in (*session.new, *session.dirty, *session.deleted)
+            if isinstance(obj, (Booking, PackageBooking)) and obj.user_id is not None
+        }
+        if touched:
+            refresh_user_stats(session.connection(), touched)
@@ -0,0 +1,106 @@
+# write_queue.py
+"""Single-writer group commit for booking writes.
+
+SQLite has one write lock, and every commit is an fsync. Instead of each
+session committing on its own, booking inserts and status changes are
+handed to one writer thread. It takes whatever has queued up (at most
+WRITE_BATCH_MAX operations, waiting up to WRITE_BATCH_WAIT_MS for
+company) and runs them in a single transaction, each inside its own
+savepoint, then commits once. Under load many clicks share one fsync and
+never contend for the lock; when idle a write is committed at once.
+
+An operation is a function taking the writer's Session. Its return value,
+or its exception, is delivered through the Future returned by submit(). A
+failing operation only rolls back its own savepoint. If the group commit
+itself fails, every operation of the group is retried alone.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import streamlit as st
+
+from database import env_int, get_writer_session_factory
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueue:
+    def __init__(self, session_factory, max_batch=32, wait_ms=2, timeout=30):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self.groups = self.operations = 0
+        self._thread = threading.Thread(target=self._loop, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, on_commit=None):
+        """Queue `fn(session)`. `on_commit(result)` runs on the writer thread once committed."""
+        future = Future()
+        self._queue.put((fn, on_commit, future))
+        return future
+
+    def run(self, fn, on_commit=None):
+        """Queue `fn(session)` and wait for its committed result (or its exception)."""
+        return self.submit(fn, on_commit).result(timeout=self.timeout)
+
+    def _next_group(self):
+        group = [self._queue.get()]
+        deadline = time.monotonic() + self.wait
+        while len(group) < self.max_batch:
+            try:
+                group.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return group
+
+    def _loop(self):
+        while True:
+            group = [op for op in self._next_group() if op[2].set_running_or_notify_cancel()]
+            try:
+                self._commit_group(group)
+            except Exception:
+                logger.exception("Group commit of %s writes failed; retrying one by one", len(group))
+                for op in group:
+                    try:
+                        self._commit_group([op])
+                    except Exception as e:
+                        op[2].set_exception(e)
+
+    def _commit_group(self, group):
+        outcomes = []  # (op, result, error), delivered only once the group is committed
+        with self.session_factory() as session:
+            with session.begin():
+                for op in group:
+                    try:
+                        with session.begin_nested():
+                            result = op[0](session)
+                    except Exception as e:
+                        outcomes.append((op, None, e))
+                    else:
+                        outcomes.append((op, result, None))
+        self.groups += 1
+        self.operations += len(group)
+        for (fn, on_commit, future), result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+                continue
+            if on_commit:
+                try:
+                    on_commit(result)
+                except Exception:
+                    logger.exception("on_commit hook failed")
+            future.set_result(result)
+
+
+@st.cache_resource
+def get_write_queue():
+    return WriteQueue(
+        get_writer_session_factory(),
+        max_batch=max(1, env_int("WRITE_BATCH_MAX", 32)),
+        wait_ms=max(0, env_int("WRITE_BATCH_WAIT_MS", 2)),
+    )